@@ -1,63 +1,82 @@
+import argparse
 import json
-import matplotlib.pyplot as plt
 from collections import defaultdict
+from aggregation import AggregationFrame
+from chart_render import ChartRenderer
+from compact_model import load_compact
+from instrumentation import enable as enable_instrumentation, timed_stage
+from keyword_classifier import KeywordClassifier, classified_conversations
+from query_store import QueryStore
+from sampling import approximate_type_summary
+from snapshot_cache import open_cached_snapshot
+from snapshot_stream import (SnapshotSources, filter_sources, is_available, load_snapshots, open_snapshot_file,
+                             sources_of)
 
 class DataProcessor:
-    def __init__(self, issues_data, discussions_data):
+    def __init__(self, issues_data, discussions_data, classifier=None, renderer=None, vectorized=False):
         self.issues_data = issues_data
         self.discussions_data = discussions_data
+        self.renderer = renderer
+        # Aggregate through NumPy group-bys instead of per-item dict increments
+        self.vectorized = vectorized
+        # Any object with classify(prompt, answer) -> keyword or None can be plugged in
+        self.classifier = classifier if classifier is not None else KeywordClassifier()
 
     def extract_issues_and_discussions(self):
-        resolved_issues = sum(1 for issue in self.issues_data['Sources'] if issue['State'] == 'CLOSED')
-        unresolved_issues = len(self.issues_data['Sources']) - resolved_issues
-
-        resolved_discussions = sum(1 for discussion in self.discussions_data['Sources'] if discussion.get('Closed', False))
-        unresolved_discussions = len(self.discussions_data['Sources']) - resolved_discussions
+        total_issues = resolved_issues = 0
+        for issue in sources_of(self.issues_data):
+            total_issues += 1
+            resolved_issues += issue['State'] == 'CLOSED'
+        unresolved_issues = total_issues - resolved_issues
+
+        total_discussions = resolved_discussions = 0
+        for discussion in sources_of(self.discussions_data):
+            total_discussions += 1
+            resolved_discussions += bool(discussion.get('Closed', False))
+        unresolved_discussions = total_discussions - resolved_discussions
 
         return resolved_issues, unresolved_issues, resolved_discussions, unresolved_discussions
 
     def calculate_success_percentage(self, data, issue_type='issue'):
-        total_items = len(data['Sources'])
-        
         if issue_type == 'issue':
-            resolved_items = sum(1 for item in data['Sources'] if item['State'] == 'CLOSED')
+            is_resolved = lambda item: item['State'] == 'CLOSED'
         elif issue_type == 'discussion':
-            resolved_items = sum(1 for item in data['Sources'] if item.get('Closed', False))
+            is_resolved = lambda item: item.get('Closed', False)
         else:
             raise ValueError("Invalid issue_type. Use 'issue' or 'discussion'.")
 
+        total_items = resolved_items = 0
+        for item in sources_of(data):
+            total_items += 1
+            if is_resolved(item):
+                resolved_items += 1
+
         success_percentage = (resolved_items / total_items) * 100 if total_items > 0 else 0
         return success_percentage
 
+    @timed_stage('DataProcessor.clean_data')
     def clean_data(self):
         # Data cleaning: Filtering out items with Status 404
-        self.issues_data['Sources'] = [issue for issue in self.issues_data['Sources'] if issue.get('Status') != 404]
-        self.discussions_data['Sources'] = [discussion for discussion in self.discussions_data['Sources'] if
-                                            discussion['ChatgptSharing'][0].get('Status') != 404]
+        # Snapshot streams are filtered lazily instead of being copied
+        self.issues_data = filter_sources(self.issues_data, lambda issue: is_available(issue, 'issue'))
+        self.discussions_data = filter_sources(self.discussions_data,
+                                               lambda discussion: is_available(discussion, 'discussion'))
 
+    def dominant_keyword(self, prompt, answer):
+        return self.classifier.classify(prompt, answer)
+
+    @timed_stage('DataProcessor.extract_issue_types', records=lambda types: sum(types[0].values()))
     def extract_issue_types(self, data):
         issue_types = defaultdict(int)
         resolved_issue_types = defaultdict(int)
 
-        for issue in data['Sources']:
+        for issue in sources_of(data):
             state = issue.get('State', 'OPEN')
 
             for conversation in issue.get('ChatgptSharing', []):
                 for code_block in conversation.get('Conversations', []):
-                    prompt = code_block.get('Prompt', '')
-                    answer = code_block.get('Answer', '')
-
-                    keywords = ['code', 'bug', 'error', 'feature', 'what is']
-                    keyword_counts = defaultdict(int)
-
-                    for keyword in keywords:
-                        if keyword in prompt.lower():
-                            keyword_counts[keyword] += 1
-                        if keyword in answer.lower():
-                            keyword_counts[keyword] += 1
-
-                    if keyword_counts:
-                        dominant_keyword = max(keyword_counts, key=keyword_counts.get)
+                    dominant_keyword = self.dominant_keyword(code_block.get('Prompt', ''), code_block.get('Answer', ''))
+                    if dominant_keyword is not None:
                         issue_types[dominant_keyword] += 1
 
                         if state == 'CLOSED':
@@ -75,13 +94,20 @@ class DataProcessor:
 
         return accuracy_per_issue_type
 
-    def plot_issue_types_accuracy(self, issue_types, accuracy_per_issue_type, resolved_issue_counts, unresolved_issue_counts, title):
+    @staticmethod
+    @timed_stage('DataProcessor.plot_issue_types_accuracy')
+    def plot_issue_types_accuracy(issue_types, accuracy_per_issue_type, resolved_issue_counts, unresolved_issue_counts, title, show=True):
+        # matplotlib is only imported when a chart is actually drawn
+        import matplotlib.pyplot as plt
+
         labels = list(issue_types.keys())
         counts = list(issue_types.values())
         accuracies = [accuracy_per_issue_type.get(issue_type, 0) for issue_type in labels]
 
-        colors = ['#66b3ff', '#99ff99', '#ffcc99', '#ff6666', '#c2c2f0']
-        explode = (0.05, 0.05, 0.05, 0.05, 0.05)  # Adjusted explode for better clarity
+        # One wedge per type, however many --keyword adds; the palette repeats past five
+        palette = ['#66b3ff', '#99ff99', '#ffcc99', '#ff6666', '#c2c2f0']
+        colors = [palette[index % len(palette)] for index in range(len(counts))]
+        explode = [0.05] * len(counts)  # Adjusted explode for better clarity
 
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))  # Increased figure size
 
@@ -118,105 +144,122 @@ class DataProcessor:
         ax2.legend()
 
         plt.tight_layout()
-        plt.show()
+        if show:
+            plt.show()
+        return fig
+
+    def render_chart(self, name, *args):
+        # Charts go to the headless renderer when one is set, otherwise to a window
+        if self.renderer is not None:
+            self.renderer.submit(name, DataProcessor.plot_issue_types_accuracy, *args)
+        else:
+            self.plot_issue_types_accuracy(*args)
 
 
 
+    @timed_stage('DataProcessor.aggregate', records=lambda summary: summary['resolved'] + summary['unresolved'])
+    def aggregate(self, data, is_resolved):
+        # Single traversal of Sources producing every per-dataset figure process_data reports
+        total_items = resolved_items = 0
+        issue_types = defaultdict(int)
+        resolved_issue_types = defaultdict(int)
+        resolved_counts = defaultdict(int)
+        unresolved_counts = defaultdict(int)
+
+        for item in sources_of(data):
+            resolved = bool(is_resolved(item))
+            total_items += 1
+            resolved_items += resolved
+
+            for dominant_keyword, state_closed in classified_conversations(item, self.dominant_keyword):
+                issue_types[dominant_keyword] += 1
+                if state_closed:
+                    resolved_issue_types[dominant_keyword] += 1
+                if resolved:
+                    resolved_counts[dominant_keyword] += 1
+                else:
+                    unresolved_counts[dominant_keyword] += 1
+
+        issue_types = dict(issue_types)
+        resolved_issue_types = dict(resolved_issue_types)
+        return {
+            'resolved': resolved_items,
+            'unresolved': total_items - resolved_items,
+            'success_percentage': (resolved_items / total_items) * 100 if total_items > 0 else 0,
+            'types': issue_types,
+            'accuracy': self.calculate_issue_type_accuracy(issue_types, resolved_issue_types),
+            'resolved_counts': resolved_counts,
+            'unresolved_counts': unresolved_counts,
+        }
+
+    @timed_stage('DataProcessor.aggregate_vectorized')
+    def aggregate_vectorized(self):
+        """Issue and discussion summaries, as aggregate returns them, from one AggregationFrame."""
+        frame = AggregationFrame()
+        frame.add_sources(sources_of(self.issues_data), 'issue', lambda issue: issue['State'] == 'CLOSED',
+                          classifier=self.classifier)
+        frame.add_sources(sources_of(self.discussions_data), 'discussion',
+                          lambda discussion: discussion.get('Closed', False), classifier=self.classifier)
+        summaries = frame.type_summaries()
+        return summaries['issue'], summaries['discussion']
+
+    def print_type_summary(self, heading, summary):
+        print(f"\n{heading}:")
+        for issue_type, count in summary['types'].items():
+            accuracy = summary['accuracy'].get(issue_type, 0)
+            print(f"{issue_type.capitalize()}: {count} (Accuracy: {accuracy:.2f}%) "
+                  f"Resolved: {summary['resolved_counts'][issue_type]}, Unresolved: {summary['unresolved_counts'][issue_type]}")
+
+    @timed_stage('DataProcessor.process_sample')
+    def process_sample(self, sample_size, replicates=200, seed=None):
+        """Estimate process_data's figures from stratified samples, with bootstrap confidence intervals."""
+        summaries = [
+            ('Issues', 'issue_types', 'Issue Types', approximate_type_summary(
+                sources_of(self.issues_data), lambda issue: issue['State'] == 'CLOSED', self.dominant_keyword,
+                sample_size, replicates, seed)),
+            ('Discussions', 'discussion_types', 'Discussion Types', approximate_type_summary(
+                sources_of(self.discussions_data), lambda discussion: discussion.get('Closed', False),
+                self.dominant_keyword, sample_size, replicates, seed)),
+        ]
+        for heading, chart_name, title, summary in summaries:
+            print(f"\n{heading} (approximate, {summary['sampled']} of {summary['population']} sampled, 95% CI):")
+            for issue_type, count in summary['types'].items():
+                accuracy = summary['accuracy'][issue_type]
+                print(f"{issue_type.capitalize()}: {count.value:.0f} [{count.low:.0f}, {count.high:.0f}] "
+                      f"(Accuracy: {accuracy.value:.2f}% [{accuracy.low:.2f}%, {accuracy.high:.2f}%])")
+            # Sources are stratified by resolution, so the success percentage is exact
+            print(f"Success Percentage ({heading}): {summary['success_percentage'].value:.2f}%")
+            # Charts show the point estimates, with counts rounded to whole conversations
+            point = {field: {issue_type: estimate.value if field == 'accuracy' else round(estimate.value)
+                             for issue_type, estimate in summary[field].items()}
+                     for field in ('types', 'accuracy', 'resolved_counts', 'unresolved_counts')}
+            self.render_chart(chart_name, point['types'], point['accuracy'], point['resolved_counts'],
+                              point['unresolved_counts'], title)
+        return {heading: summary for heading, _, _, summary in summaries}
+
+    @timed_stage('DataProcessor.process_data')
     def process_data(self):
-        resolved_issues, unresolved_issues, resolved_discussions, unresolved_discussions = self.extract_issues_and_discussions()
-
-        success_percentage_issues = self.calculate_success_percentage(self.issues_data, issue_type='issue')
-        success_percentage_discussions = self.calculate_success_percentage(self.discussions_data, issue_type='discussion')
-
-        # Extract issue types and calculate accuracy for Issues
-        issue_types, resolved_issue_types = self.extract_issue_types(self.issues_data)
-        accuracy_per_issue_type = self.calculate_issue_type_accuracy(issue_types, resolved_issue_types)
-
-        # Extract resolved and unresolved counts per issue type for Issues
-        resolved_issue_counts = defaultdict(int)
-        unresolved_issue_counts = defaultdict(int)
-
-        for issue in self.issues_data['Sources']:
-            state = issue.get('State', 'OPEN')
-
-            for conversation in issue.get('ChatgptSharing', []):
-                for code_block in conversation.get('Conversations', []):
-                    prompt = code_block.get('Prompt', '')
-                    answer = code_block.get('Answer', '')
-
-                    keywords = ['code', 'bug', 'error', 'feature', 'what is']
-                    keyword_counts = defaultdict(int)
-
-                    for keyword in keywords:
-                        if keyword in prompt.lower():
-                            keyword_counts[keyword] += 1
-                        if keyword in answer.lower():
-                            keyword_counts[keyword] += 1
-
-                    if keyword_counts:
-                        dominant_keyword = max(keyword_counts, key=keyword_counts.get)
-
-                        if state == 'CLOSED':
-                            resolved_issue_counts[dominant_keyword] += 1
-                        else:
-                            unresolved_issue_counts[dominant_keyword] += 1
-
-        print("\nIssues:")
-        total_resolved_issues = sum(resolved_issue_counts.values())
-        total_unresolved_issues = sum(unresolved_issue_counts.values())
+        if self.vectorized:
+            issues, discussions = self.aggregate_vectorized()
+        else:
+            issues = self.aggregate(self.issues_data, lambda issue: issue['State'] == 'CLOSED')
+            discussions = self.aggregate(self.discussions_data, lambda discussion: discussion.get('Closed', False))
 
-        for issue_type, count in issue_types.items():
-            accuracy = accuracy_per_issue_type.get(issue_type, 0)
-            print(f"{issue_type.capitalize()}: {count} (Accuracy: {accuracy:.2f}%) "
-                  f"Resolved: {resolved_issue_counts[issue_type]}, Unresolved: {unresolved_issue_counts[issue_type]}")
+        self.print_type_summary('Issues', issues)
+        total_resolved_issues = sum(issues['resolved_counts'].values())
+        total_unresolved_issues = sum(issues['unresolved_counts'].values())
 
         # Plot pie chart and bar graph for issue types with accuracy for Issues
-        self.plot_issue_types_accuracy(issue_types, accuracy_per_issue_type, resolved_issue_counts, unresolved_issue_counts, 'Issue Types')
-
-        # Extract issue types and calculate accuracy for Discussions
-        discussion_types, resolved_discussion_types = self.extract_issue_types(self.discussions_data)
-        accuracy_per_discussion_type = self.calculate_issue_type_accuracy(discussion_types, resolved_discussion_types)
-
-        # Extract resolved and unresolved counts per issue type for Discussions
-        resolved_discussion_counts = defaultdict(int)
-        unresolved_discussion_counts = defaultdict(int)
+        self.render_chart('issue_types', issues['types'], issues['accuracy'], issues['resolved_counts'],
+                          issues['unresolved_counts'], 'Issue Types')
 
-        for discussion in self.discussions_data['Sources']:
-            state = discussion.get('Closed', False)
-
-            for conversation in discussion.get('ChatgptSharing', []):
-                for code_block in conversation.get('Conversations', []):
-                    prompt = code_block.get('Prompt', '')
-                    answer = code_block.get('Answer', '')
-
-                    keywords = ['code', 'bug', 'error', 'feature', 'what is']
-                    keyword_counts = defaultdict(int)
-
-                    for keyword in keywords:
-                        if keyword in prompt.lower():
-                            keyword_counts[keyword] += 1
-                        if keyword in answer.lower():
-                            keyword_counts[keyword] += 1
-
-                    if keyword_counts:
-                        dominant_keyword = max(keyword_counts, key=keyword_counts.get)
-
-                        if state:
-                            resolved_discussion_counts[dominant_keyword] += 1
-                        else:
-                            unresolved_discussion_counts[dominant_keyword] += 1
-
-        print("\nDiscussions:")
-        total_resolved_discussions = sum(resolved_discussion_counts.values())
-        total_unresolved_discussions = sum(unresolved_discussion_counts.values())
-
-        for issue_type, count in discussion_types.items():
-            accuracy = accuracy_per_discussion_type.get(issue_type, 0)
-            print(f"{issue_type.capitalize()}: {count} (Accuracy: {accuracy:.2f}%) "
-                  f"Resolved: {resolved_discussion_counts[issue_type]}, Unresolved: {unresolved_discussion_counts[issue_type]}")
+        self.print_type_summary('Discussions', discussions)
+        total_resolved_discussions = sum(discussions['resolved_counts'].values())
+        total_unresolved_discussions = sum(discussions['unresolved_counts'].values())
 
         # Plot pie chart and bar graph for issue types with accuracy for Discussions
-        self.plot_issue_types_accuracy(discussion_types, accuracy_per_discussion_type, resolved_discussion_counts, unresolved_discussion_counts, 'Discussion Types')
+        self.render_chart('discussion_types', discussions['types'], discussions['accuracy'], discussions['resolved_counts'],
+                          discussions['unresolved_counts'], 'Discussion Types')
 
         # Overall accuracy calculations
         overall_accuracy_issues = (total_resolved_issues / (total_resolved_issues + total_unresolved_issues)) * 100 if (total_resolved_issues + total_unresolved_issues) > 0 else 0
@@ -233,12 +276,13 @@ class DataProcessor:
         print(f"Total Unresolved Discussions: {total_unresolved_discussions}")
         print(f"Overall Success Percentage (Discussions): {overall_accuracy_discussions:.2f}%")
 
-        return resolved_issues, unresolved_issues, resolved_discussions, unresolved_discussions, \
-               success_percentage_issues, success_percentage_discussions
+        return issues['resolved'], issues['unresolved'], discussions['resolved'], discussions['unresolved'], \
+               issues['success_percentage'], discussions['success_percentage']
 
+@timed_stage(records=lambda data: len(data['Sources']) if data else 0)
 def load_json_file(file_path):
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
+        with open_snapshot_file(file_path) as file:
             data = json.load(file)
             return data
     except FileNotFoundError as e:
@@ -248,18 +292,73 @@ def load_json_file(file_path):
         print(f"Error: Invalid JSON format in the file {file_path}")
         return None
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Issue and discussion resolution analysis')
+    parser.add_argument('--stream', action='store_true',
+                        help='stream Sources from disk instead of loading whole snapshots')
+    parser.add_argument('--cache', action='store_true',
+                        help='read snapshots through the memory-mapped columnar cache, building it on first use')
+    parser.add_argument('--compact', action='store_true',
+                        help='hold Sources as compact slotted records instead of JSON dicts')
+    parser.add_argument('--numpy', action='store_true',
+                        help='aggregate the chart inputs with NumPy group-bys')
+    parser.add_argument('--approximate', action='store_true',
+                        help='estimate the figures from a stratified sample of Sources, with confidence intervals')
+    parser.add_argument('--sample-size', type=int, default=1000,
+                        help='Sources sampled per resolved/unresolved stratum with --approximate')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for --approximate')
+    parser.add_argument('--store', default=None,
+                        help='read snapshots through this SQLite query store, ingesting them on first use')
+    parser.add_argument('--output-dir', default=None,
+                        help='render charts headlessly into this directory instead of showing windows')
+    parser.add_argument('--format', action='append', dest='formats', choices=['png', 'svg'],
+                        help='chart file format for --output-dir (repeatable, default: png)')
+    parser.add_argument('--profile-report', default=None,
+                        help='record per-stage time, records/s and peak RSS to this .json or .csv file')
+    parser.add_argument('--cprofile', default=None,
+                        help='also dump cProfile stats to this file (with --profile-report)')
+    parser.add_argument('--keyword', action='append', default=[], dest='keywords',
+                        help='extra keyword to add to the issue type taxonomy (repeatable)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile_report:
+        enable_instrumentation(args.profile_report, args.cprofile)
     issues_file_path = 'snapshot/20230831_061759_issue_sharings.json'
     discussions_file_path = 'snapshot/20230831_061926_discussion_sharings.json'
 
-    issues_data = load_json_file(issues_file_path)
-    discussions_data = load_json_file(discussions_file_path)
+    if args.store:
+        store = QueryStore(args.store)
+        issues_data = store.open_snapshot(issues_file_path)
+        discussions_data = store.open_snapshot(discussions_file_path)
+    elif args.cache:
+        issues_data = open_cached_snapshot(issues_file_path)
+        discussions_data = open_cached_snapshot(discussions_file_path)
+    elif args.compact:
+        issues_data = load_compact(issues_file_path)
+        discussions_data = load_compact(discussions_file_path)
+    elif args.stream or args.approximate:
+        # Stream Sources from disk on each pass instead of holding the whole snapshot
+        issues_data = SnapshotSources(issues_file_path)
+        discussions_data = SnapshotSources(discussions_file_path)
+    else:
+        issues_data, discussions_data = load_snapshots([issues_file_path, discussions_file_path], load_json_file)
 
     if issues_data is not None and discussions_data is not None:
-        data_processor = DataProcessor(issues_data, discussions_data)
+        classifier = KeywordClassifier(extra_keywords=args.keywords)
+        renderer = ChartRenderer(args.output_dir, args.formats or ['png']) if args.output_dir else None
+        data_processor = DataProcessor(issues_data, discussions_data, classifier=classifier, renderer=renderer,
+                                       vectorized=args.numpy)
         data_processor.clean_data()
-        resolved_issues, unresolved_issues, resolved_discussions, unresolved_discussions, \
-        success_percentage_issues, success_percentage_discussions = data_processor.process_data()
+        if args.approximate:
+            data_processor.process_sample(args.sample_size, seed=args.seed)
+        else:
+            resolved_issues, unresolved_issues, resolved_discussions, unresolved_discussions, \
+            success_percentage_issues, success_percentage_discussions = data_processor.process_data()
+        if renderer is not None:
+            for name, status in renderer.close().items():
+                print(f"Chart {name}: {status}")
 
         
 if __name__ == "__main__":
@@ -1,94 +1,73 @@
 '''1.What is the typical structure of conversations between developers and ChatGPT? How many turns does it take on average to reach a conclusion? '''
 
+import argparse
 import json
-import matplotlib.pyplot as plt
-import numpy as np
-import re
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-import html
-from bs4 import BeautifulSoup
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
-
-
+from text_cleaner import TextCleaner, configure_nltk
+from aggregation import AggregationFrame
+from chart_render import ChartRenderer
+from compact_model import load_compact
+from instrumentation import enable as enable_instrumentation, timed_stage
+from prompt_stats import PromptCountStats
+from query_store import QueryStore
+from sampling import approximate_prompt_averages
+from snapshot_cache import open_cached_snapshot
+from snapshot_stream import SnapshotSources, iter_sources, load_snapshots, open_snapshot_file, sources_of
+from state_classifier import StateClassifier, state_agreement
+
+
+@timed_stage(records=lambda data: len(data['Sources']))
 def load_json(json_file_path):
     """Load JSON data from a file."""
-    with open(json_file_path, 'r') as file:
+    with open_snapshot_file(json_file_path) as file:
         data = json.load(file)
     return data
 
-nltk.download('stopwords')
-nltk.download('punkt')
-nltk.download('wordnet')
-
-def preprocess_and_clean(json_data):
-    # Define a function to clean text
-    def clean_text(text):
-        if text is not None:
-            # Remove HTML tags
-            cleaned_text = BeautifulSoup(text, 'html.parser').get_text()
-            # Decode HTML entities
-            cleaned_text = html.unescape(cleaned_text)
-            # Convert to lowercase
-            cleaned_text = cleaned_text.lower()
-            # Remove non-alphanumeric characters
-            cleaned_text = re.sub(r'[^a-zA-Z0-9\s]', '', cleaned_text)
-            # Remove stopwords
-            stop_words = set(stopwords.words('english'))
-            word_tokens = word_tokenize(cleaned_text)
-            cleaned_text = ' '.join([word for word in word_tokens if word not in stop_words])
-            # Lemmatization
-            lemmatizer = WordNetLemmatizer()
-            cleaned_text = ' '.join([lemmatizer.lemmatize(word) for word in word_tokens])
-            # Remove extra whitespaces
-            cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
-            return cleaned_text
-        return None
+_default_cleaner = None
+
+def get_text_cleaner():
+    """Return the shared TextCleaner, creating it on first use."""
+    global _default_cleaner
+    if _default_cleaner is None:
+        _default_cleaner = TextCleaner()
+    return _default_cleaner
+
+@timed_stage()
+def preprocess_and_clean(json_data, cleaner=None, clean_conversations=False):
+    """Clean top-level Title/Body and, optionally, every nested Prompt/Answer."""
+    def clean_many(texts):
+        # The NLTK-backed cleaner is only built once there is text to clean;
+        # snapshot roots usually carry no Title/Body at all.
+        if all(text is None for text in texts):
+            return [None] * len(texts)
+        return (cleaner if cleaner is not None else get_text_cleaner()).clean_many(texts)
 
     # ... (existing code for date conversion)
 
     # Clean and handle null values for top-level attributes
-    json_data['Title'] = clean_text(json_data.get('Title'))
-    json_data['Body'] = clean_text(json_data.get('Body'))
-
-    # ... (existing code for nested conversation data)
+    json_data['Title'], json_data['Body'] = clean_many([json_data.get('Title'), json_data.get('Body')])
+
+    if clean_conversations:
+        conversations = [conversation
+                         for source in json_data.get('Sources', [])
+                         for sharing in source.get('ChatgptSharing', [])
+                         for conversation in sharing.get('Conversations', [])]
+        prompts = clean_many([conversation.get('Prompt') for conversation in conversations])
+        answers = clean_many([conversation.get('Answer') for conversation in conversations])
+        for conversation, prompt, answer in zip(conversations, prompts, answers):
+            conversation['Prompt'] = prompt
+            conversation['Answer'] = answer
 
     return json_data
-def issuecategorization(data):
-  pull_requests = data["Sources"]
-
-  for pr in data:
-    # Access the ChatGPT conversations
-    conversations = pr["ChatgptSharing"][0]["Conversations"]
-
-    # Loop through each conversation
-    for conversation in conversations:
-        # Analyze the answer for complex pattern matching
-        answer = conversation["Answer"].lower()
-
-        # Define complex patterns for an open state
-        open_patterns = [r'\b(?:Concerns|Revisit|Review|Thoroughly|Additional information|Reconsider|Alternative|Explore|Possibilities|Not on the same page|Not reached a resolution|Collaboration|Issue|Investigate|Progress|Insights|Not the same page|Alternative solutions|Challenge|Less-than-ideal situation)\b'
-        ]
-
-        # Define complex patterns for a closed state
-        closed_patterns = [
-            r'\b(?:Closed|Result|Gratitude|Appreciate|Information|Confirmation|Closure|Assistance|Future|Reach out)\b',
-            r'\b(?:Closed|Implement|Thanks|Discussing|Collaboration|Consider|Understanding|Alternative|Approaches|Solutions|Investigating|Progress|Insights|Follow up|Circle back|Findings)\b'
-        ]
-
-        # Check for complex patterns suggesting an open state
-        if any(re.search(pattern, answer) for pattern in open_patterns):
-            pr_state = "Open"
-        else:
-            # Check for complex patterns suggesting a closed state
-            if any(re.search(pattern, answer) for pattern in closed_patterns):
-                pr_state = "Closed"
-            else:
-                pr_state = "Uncertain"
+@timed_stage(records=len)
+def issuecategorization(data, classifier=None, max_workers=None):
+    """Label each source Open, Closed or Uncertain from the wording of its concluding answer."""
+    pull_requests = sources_of(data)
+    classifier = classifier if classifier is not None else StateClassifier()
+    return classifier.classify_sources(pull_requests, max_workers=max_workers)
 
-    return data
 def extract_prompt_counts(source, state):
     """Extract the prompt counts from the given source and state."""
     prompts = []
@@ -103,8 +82,73 @@ def calculate_average(prompt_list):
         return 0
     return round(sum(prompt_list) / len(prompt_list))
 
-def plot_side_by_side_bar_chart_multi(categories, bar_series_list, chart_title, series_names, colors=None):
+def is_closed(source, discussions=False):
+    """Return whether a source counts as closed for prompt-count tallies; kinds without State are open."""
+    if discussions:
+        return source.get('Closed') == True
+    return source.get('State') == "CLOSED"
+
+@timed_stage()
+def tally_prompt_counts(sources, discussions=False, source_type=None, prompt_stats=None):
+    """Feed each source's prompt counts into streaming stats keyed by (source_type, state)."""
+    prompt_stats = prompt_stats if prompt_stats is not None else PromptCountStats()
+    for source in sources:
+        state = 'CLOSED' if is_closed(source, discussions) else 'OPEN'
+        prompt_stats.add_many((source_type, state), extract_prompt_counts(source, state))
+    return prompt_stats
+
+def stored_prompt_counts(store, json_file_path, discussions=False, source_type=None, prompt_stats=None):
+    """tally_prompt_counts for a snapshot in a QueryStore, read from its indexed sharings without decoding Sources."""
+    prompt_stats = prompt_stats if prompt_stats is not None else PromptCountStats()
+    if not store.is_ingested(json_file_path):
+        store.ingest(json_file_path)
+    # Same split as is_closed: a State other than CLOSED, or no State, counts as open
+    if discussions:
+        state_filters = {'OPEN': {'closed': False}, 'CLOSED': {'closed': True}}
+    else:
+        state_filters = {'OPEN': {'not_state': 'CLOSED'}, 'CLOSED': {'state': 'CLOSED'}}
+    snapshot = os.path.basename(json_file_path)
+    for state, filters in state_filters.items():
+        prompt_stats.add_many((source_type, state), store.prompt_counts(snapshot=snapshot, **filters))
+    return prompt_stats
+
+def prompt_average_series(prompt_stats, source_types):
+    """Open/closed average prompt counts per source type, as plotted by plot_prompt_averages."""
+    return [[prompt_stats[(source_type, 'OPEN')].average(), prompt_stats[(source_type, 'CLOSED')].average()]
+            for source_type in source_types]
+
+def _tally_file(json_file_path, discussions, source_type):
+    return tally_prompt_counts(iter_sources(json_file_path), discussions, source_type)
+
+def parallel_prompt_tallies(jobs, max_workers=None):
+    """Tally prompt counts for (file path, discussions, source type) jobs across a process pool.
+
+    Each worker streams and tallies whole files itself, so only the small
+    PromptCountStats results cross process boundaries.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers or min(len(jobs), os.cpu_count() or 1) or 1) as executor:
+        futures = [executor.submit(_tally_file, json_file_path, discussions, source_type)
+                   for json_file_path, discussions, source_type in jobs]
+        prompt_stats = PromptCountStats()
+        for future in futures:
+            prompt_stats.merge(future.result())
+        return prompt_stats
+
+def parallel_prompt_averages(file_groups, series_groups, max_workers=None):
+    """Open/closed prompt averages for (pr, issue, discussions) file groups, computed in one pool."""
+    jobs = [(json_file_path, index == 2, series_names[index])
+            for group, series_names in zip(file_groups, series_groups)
+            for index, json_file_path in enumerate(group)]
+    prompt_stats = parallel_prompt_tallies(jobs, max_workers)
+    return [prompt_average_series(prompt_stats, series_names) for series_names in series_groups]
+
+@timed_stage()
+def plot_side_by_side_bar_chart_multi(categories, bar_series_list, chart_title, series_names, colors=None, show=True):
     """Plot side-by-side bar charts with multiple bar series and optional colors."""
+    # Plotting libraries are only imported when a chart is actually drawn
+    import matplotlib.pyplot as plt
+    import numpy as np
+
     bar_width = 0.2  # Define the width of the bars
     bar_height = 0.2
 
@@ -136,82 +180,179 @@ def plot_side_by_side_bar_chart_multi(categories, bar_series_list, chart_title,
     ax.legend()
 
     # Show the bar chart
-    plt.show()
-
-
-
-def AvgPromptCount(json_file_path_pr, json_file_path_issue, json_file_path_discussions, series):
-    """Calculate and plot the average prompt counts for open and closed states."""
-
-    data_pr = load_json(json_file_path_pr)
-    cleaned_data_pr = preprocess_and_clean(data_pr)
-
-    data_issue = load_json(json_file_path_issue)
-    cleaned_data_issue = preprocess_and_clean(data_issue)
-
-    data_discussions = load_json(json_file_path_discussions)
-    cleaned_data_discussions = preprocess_and_clean(data_discussions)
-
-    opened_pr, closed_pr = [], []
-    opened_issue, closed_issue = [], []
-    opened_discussions, closed_discussions = [], []
-
-    for source in cleaned_data_pr['Sources']:
-       if source['State'] == "CLOSED":
-            closed_pr.extend(extract_prompt_counts(source, 'CLOSED'))
-       else:
-            opened_pr.extend(extract_prompt_counts(source, 'OPEN'))
-
-       avg_opened_pr = calculate_average(opened_pr)
-       avg_closed_pr = calculate_average(closed_pr)
-
-    for source in cleaned_data_issue['Sources']:
-         if source['State'] == "CLOSED":
-            closed_issue.extend(extract_prompt_counts(source, 'CLOSED'))
-         else:
-            opened_issue.extend(extract_prompt_counts(source, 'OPEN'))
-
-         avg_opened_issue = calculate_average(opened_issue)
-         avg_closed_issue = calculate_average(closed_issue)
-
-    for source in cleaned_data_discussions['Sources']:
-        if source['Closed'] == True :
-           closed_discussions.extend(extract_prompt_counts(source, 'CLOSED'))
-        else:
-           opened_discussions.extend(extract_prompt_counts(source, 'OPEN'))
-
-        avg_opened_discussions = calculate_average(opened_discussions)
-        avg_closed_discussions = calculate_average(closed_discussions)
-
+    if show:
+        plt.show()
+    return fig
+
+
+
+def load_snapshot(json_file_path, streaming=False, cached=False, store=None, compact=False):
+    """Load and clean a snapshot, or read its Sources from disk, the columnar cache, a query store or compact records."""
+    if store is not None:
+        return store.open_snapshot(json_file_path)
+    if cached:
+        return open_cached_snapshot(json_file_path)
+    if compact:
+        return load_compact(json_file_path)
+    if streaming:
+        # Only the top-level attributes are cleaned, and a stream has none
+        return SnapshotSources(json_file_path)
+    return preprocess_and_clean(load_json(json_file_path))
+
+def plot_prompt_averages(bar_series_list, series, renderer=None):
+    """Plot open/closed average prompt counts for each series, or queue it on a headless renderer."""
     categories = ['Open', 'Closed']
+    colors = ['#3498db', '#2ecc71', '#e67e22']
+    #colors=['#2BB4D4', '#5CE1E6', '#004AAD']
+    # Optional: specify colors for each series
+
+    if renderer is not None:
+        name = 'avg_prompts_' + '_'.join(series_name.lower().replace(' ', '_') for series_name in series)
+        renderer.submit(name, plot_side_by_side_bar_chart_multi, categories, bar_series_list, '',
+                        series_names=series, colors=colors)
+        return
 
     # Use the new function to plot with three bar series
-    plot_side_by_side_bar_chart_multi(
-        categories,
-        [
-            [avg_opened_pr, avg_closed_pr],
-            [avg_opened_issue, avg_closed_issue],
-            [avg_opened_discussions, avg_closed_discussions]
-        ],
-        '',
-        series_names=series,
-        colors=['#3498db', '#2ecc71', '#e67e22']
-        #colors=['#2BB4D4', '#5CE1E6', '#004AAD']
-        # Optional: specify colors for each series
-
-    )
-
-
-# Example usage with three input file paths
-json_file_path_pr = '/content/drive/MyDrive/devgpt snapshot/20230831_060603_pr_sharings.json'
-json_file_path_issue = '/content/drive/MyDrive/devgpt snapshot/20230831_061759_issue_sharings.json'
-json_file_path_discussions='/content/drive/MyDrive/devgpt snapshot/20230824_102000_discussion_sharings.json'
-json_file_path_commit = '/content/drive/MyDrive/devgpt snapshot/20230831_061759_issue_sharings.json'
-
-json_file_path_file = '/content/drive/MyDrive/devgpt snapshot/20230831_060603_pr_sharings.json'
-json_file_path_hackernews='/content/drive/MyDrive/devgpt snapshot/20230824_102000_discussion_sharings.json'
-
-series=['Pull Request', 'Issue', 'Discussions']
-series2=['File sharings','Hacker News','Commit sharings']
-AvgPromptCount(json_file_path_pr, json_file_path_issue,json_file_path_discussions,series)
-AvgPromptCount(json_file_path_commit,json_file_path_file,json_file_path_hackernews,series2)
+    plot_side_by_side_bar_chart_multi(categories, bar_series_list, '', series_names=series, colors=colors)
+
+@timed_stage()
+def AvgPromptCount(json_file_path_pr, json_file_path_issue, json_file_path_discussions, series, streaming=False,
+                   parallel=False, max_workers=None, cached=False, renderer=None, store=None,
+                   compact=False, vectorized=False, sample_size=None, seed=None):
+    """Calculate and plot the average prompt counts for open and closed states.
+
+    With sample_size, averages are estimated from a stratified sample of each
+    file's Sources and printed with 95% bootstrap confidence intervals.
+    """
+    if sample_size:
+        groups = []
+        for json_file_path, discussions, series_name in zip(
+                [json_file_path_pr, json_file_path_issue, json_file_path_discussions], (False, False, True), series):
+            sources = sources_of(load_snapshot(json_file_path, True, cached, store, compact))
+            groups.append((sources, lambda source, discussions=discussions: is_closed(source, discussions), series_name))
+        estimates = approximate_prompt_averages(groups, sample_size, seed=seed)
+        for (series_name, state), estimate in estimates.items():
+            if estimate.value is not None:
+                print(f"{series_name} {state}: {estimate.value:.2f} prompts [{estimate.low:.2f}, {estimate.high:.2f}]")
+        plot_prompt_averages([[round(estimates[(series_name, state)].value or 0) for state in ('OPEN', 'CLOSED')]
+                              for series_name in series], series, renderer)
+        return estimates
+
+    if parallel:
+        bar_series_list, = parallel_prompt_averages(
+            [(json_file_path_pr, json_file_path_issue, json_file_path_discussions)], [series], max_workers)
+        plot_prompt_averages(bar_series_list, series, renderer)
+        return
+
+    json_file_paths = [json_file_path_pr, json_file_path_issue, json_file_path_discussions]
+    if store is not None and not vectorized:
+        # Prompt counts are index lookups on the store's sharings table; no stored Source is decoded
+        prompt_stats = PromptCountStats()
+        for json_file_path, discussions, series_name in zip(json_file_paths, (False, False, True), series):
+            stored_prompt_counts(store, json_file_path, discussions, series_name, prompt_stats)
+        plot_prompt_averages(prompt_average_series(prompt_stats, series), series, renderer)
+        return prompt_stats
+    if store is not None:
+        # A SQLite connection is used only from the thread that opened it
+        loaded = [load_snapshot(json_file_path, streaming, cached, store, compact) for json_file_path in json_file_paths]
+    else:
+        # The three files are read and decompressed concurrently
+        loaded = load_snapshots(json_file_paths,
+                                lambda json_file_path: load_snapshot(json_file_path, streaming, cached, compact=compact))
+    cleaned_data_pr, cleaned_data_issue, cleaned_data_discussions = loaded
+
+    if vectorized:
+        frame = AggregationFrame()
+        for data, series_name, discussions in zip(loaded, series, (False, False, True)):
+            frame.add_sources(sources_of(data), series_name, lambda source: is_closed(source, discussions))
+        plot_prompt_averages(frame.prompt_means(series), series, renderer)
+        return frame
+
+    # One accumulator per (series, state): averages are read once at the end, not per source
+    prompt_stats = PromptCountStats()
+    tally_prompt_counts(sources_of(cleaned_data_pr), False, series[0], prompt_stats)
+    tally_prompt_counts(sources_of(cleaned_data_issue), False, series[1], prompt_stats)
+    tally_prompt_counts(sources_of(cleaned_data_discussions), True, series[2], prompt_stats)
+
+    plot_prompt_averages(prompt_average_series(prompt_stats, series), series, renderer)
+    return prompt_stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Average prompt counts for open and closed sharings')
+    parser.add_argument('--stream', action='store_true',
+                        help='stream Sources from disk instead of loading whole snapshots')
+    parser.add_argument('--cache', action='store_true',
+                        help='read snapshots through the memory-mapped columnar cache, building it on first use')
+    parser.add_argument('--compact', action='store_true',
+                        help='hold Sources as compact slotted records instead of JSON dicts')
+    parser.add_argument('--numpy', action='store_true',
+                        help='aggregate prompt counts with NumPy group-bys')
+    parser.add_argument('--approximate', action='store_true',
+                        help='estimate prompt averages from a stratified sample of Sources, with confidence intervals')
+    parser.add_argument('--sample-size', type=int, default=1000,
+                        help='Sources sampled per open/closed stratum of each file with --approximate')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for --approximate')
+    parser.add_argument('--store', default=None,
+                        help='read snapshots through this SQLite query store, ingesting them on first use')
+    parser.add_argument('--output-dir', default=None,
+                        help='render charts headlessly into this directory instead of showing windows')
+    parser.add_argument('--format', action='append', dest='formats', choices=['png', 'svg'],
+                        help='chart file format for --output-dir (repeatable, default: png)')
+    parser.add_argument('--profile-report', default=None,
+                        help='record per-stage time, records/s and peak RSS to this .json or .csv file')
+    parser.add_argument('--cprofile', default=None,
+                        help='also dump cProfile stats to this file (with --profile-report)')
+    parser.add_argument('--nltk-data', default=None,
+                        help='directory holding the stopwords, punkt (punkt_tab on NLTK 3.8.2+) and wordnet NLTK corpora')
+    parser.add_argument('--allow-nltk-download', action='store_true',
+                        help='download missing NLTK corpora instead of failing')
+    parser.add_argument('--categorize', action='store_true',
+                        help='label PR and issue sources Open/Closed/Uncertain and report agreement with State')
+    parser.add_argument('--parallel', action='store_true',
+                        help='tally every snapshot file in its own worker process')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes for --parallel (default: all cores) and --categorize')
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    configure_nltk(args.nltk_data, args.allow_nltk_download or None)
+    if args.profile_report:
+        enable_instrumentation(args.profile_report, args.cprofile)
+
+    # Example usage with three input file paths
+    json_file_path_pr = '/content/drive/MyDrive/devgpt snapshot/20230831_060603_pr_sharings.json'
+    json_file_path_issue = '/content/drive/MyDrive/devgpt snapshot/20230831_061759_issue_sharings.json'
+    json_file_path_discussions='/content/drive/MyDrive/devgpt snapshot/20230824_102000_discussion_sharings.json'
+    json_file_path_commit = '/content/drive/MyDrive/devgpt snapshot/20230831_061759_issue_sharings.json'
+
+    json_file_path_file = '/content/drive/MyDrive/devgpt snapshot/20230831_060603_pr_sharings.json'
+    json_file_path_hackernews='/content/drive/MyDrive/devgpt snapshot/20230824_102000_discussion_sharings.json'
+
+    series=['Pull Request', 'Issue', 'Discussions']
+    series2=['File sharings','Hacker News','Commit sharings']
+    renderer = ChartRenderer(args.output_dir, args.formats or ['png']) if args.output_dir else None
+    store = QueryStore(args.store) if args.store else None
+    if args.categorize:
+        for series_name, json_file_path in [('Pull Request', json_file_path_pr), ('Issue', json_file_path_issue)]:
+            data = load_json(json_file_path)
+            labels = issuecategorization(data, max_workers=args.workers)
+            agreement = state_agreement(labels, [source.get('State') for source in data['Sources']])
+            print(f"{series_name}: coverage {agreement['coverage']:.2%}, agreement {agreement['agreement']:.2%}, "
+                  f"{agreement['confusion']}")
+    if args.parallel and not args.approximate:
+        # Both charts' six files share one pool so no core idles between them
+        file_groups = [(json_file_path_pr, json_file_path_issue, json_file_path_discussions),
+                       (json_file_path_commit, json_file_path_file, json_file_path_hackernews)]
+        for bar_series_list, series_names in zip(parallel_prompt_averages(file_groups, [series, series2], args.workers), [series, series2]):
+            plot_prompt_averages(bar_series_list, series_names, renderer)
+    else:
+        AvgPromptCount(json_file_path_pr, json_file_path_issue,json_file_path_discussions,series, streaming=args.stream, cached=args.cache, renderer=renderer, store=store, compact=args.compact, vectorized=args.numpy,
+                       sample_size=args.sample_size if args.approximate else None, seed=args.seed)
+        AvgPromptCount(json_file_path_commit,json_file_path_file,json_file_path_hackernews,series2, streaming=args.stream, cached=args.cache, renderer=renderer, store=store, compact=args.compact, vectorized=args.numpy,
+                       sample_size=args.sample_size if args.approximate else None, seed=args.seed)
+    if renderer is not None:
+        for name, status in renderer.close().items():
+            print(f"Chart {name}: {status}")
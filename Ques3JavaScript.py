@@ -1,37 +1,24 @@
-import json
-from radon.complexity import cc_visit
-from radon.metrics import mi_visit
+import argparse
+from complexity_engine import ComplexityEngine, c_like_complexity
+from snapshot_cache import open_cached_snapshot
+from snapshot_stream import SnapshotSources
+from snippet_store import SnippetStore
+
+parser = argparse.ArgumentParser(description='Cyclomatic complexity of each distinct JavaScript snippet')
+parser.add_argument('--cache', action='store_true',
+                    help='read the snapshot through the memory-mapped columnar cache, building it on first use')
+args = parser.parse_args()
 
 # Replace 'your_file_path.json' with the actual path to your JSON file
 file_path = r'snapshot\20230907_110036_commit_sharings.json'
 
-# Read JSON data from the file
-with open(file_path, 'r') as file:
-    data = json.load(file)
-    
-# Function to calculate cyclomatic complexity
-def calculate_cyclomatic_complexity(code):
-    # Split code into lines and remove empty lines and comments
-    lines = [line.strip() for line in code.split('\n') if line.strip() and not line.strip().startswith('//')]
-
-    # Initialize complexity with 1 (base complexity)
-    complexity = 1
-
-    # Count decision points
-    for line in lines:
-        if 'if (' in line or 'while (' in line or 'for (' in line:
-            complexity += 1
-
-    return complexity
+def print_javascript(language, javascript_code, js_complexity, occurrences):
+    print("javascript Code:")
+    print(javascript_code)
+    print(f"Cyclomatic Complexity for Javascript code: {js_complexity}")
+    print(f"Occurrences: {occurrences}")
 
-# Iterate through conversations and print JavaScript content with cyclomatic complexity
-for source in data.get("Sources", []):
-    for chatgpt_sharing in source.get("ChatgptSharing", []):
-        for conversation in chatgpt_sharing.get("Conversations", []):
-            for code_snippet in conversation.get("ListOfCode", []):
-                if code_snippet.get("Type") == "javascript":
-                    javascript_code = code_snippet.get("Content")
-                    print("javascript Code:")
-                    print(javascript_code)
-                    js_complexity = calculate_cyclomatic_complexity(javascript_code)
-                    print(f"Cyclomatic Complexity for Javascript code: {js_complexity}")
+# Print each distinct JavaScript snippet once, with its cyclomatic complexity and occurrence count
+snippets = SnippetStore()
+snippets.add_sources(open_cached_snapshot(file_path) if args.cache else SnapshotSources(file_path), 'commit')
+snippets.measure(ComplexityEngine({'javascript': c_like_complexity}), on_snippet=print_javascript)
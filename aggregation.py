@@ -0,0 +1,190 @@
+from array import array
+from collections import defaultdict
+
+from keyword_classifier import classified_conversations
+
+# Column name -> array typecode. Kind, keyword and language columns hold
+# category codes; only conversations with a dominant keyword are recorded.
+COLUMNS = {
+    'source_kind': 'h',
+    'source_resolved': 'b',
+    'conversation_kind': 'h',
+    'conversation_resolved': 'b',
+    'conversation_state_closed': 'b',
+    'conversation_keyword': 'h',
+    'sharing_kind': 'h',
+    'sharing_resolved': 'b',
+    'sharing_prompts': 'q',
+    'snippet_kind': 'h',
+    'snippet_language': 'h',
+    'snippet_metric': 'd',
+}
+
+
+class Categories:
+    """Dense integer codes for labels, assigned in first-seen order."""
+
+    def __init__(self, labels=()):
+        self.labels = []
+        self.codes = {}
+        for label in labels:
+            self.code(label)
+
+    def code(self, label):
+        code = self.codes.get(label)
+        if code is None:
+            code = self.codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def __len__(self):
+        return len(self.labels)
+
+
+class AggregationFrame:
+    """The fields behind the charts as typed columns, aggregated with NumPy group-bys.
+
+    Sources are read once by add_sources; every summary after that is a handful
+    of bincount calls over all kinds at once instead of per-item Python loops.
+    """
+
+    def __init__(self):
+        self.kinds = Categories()
+        self.keywords = Categories()
+        self.languages = Categories()
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        self._arrays = None
+
+    def add_sources(self, sources, kind, is_resolved, classifier=None, engine=None):
+        """Append one kind's Sources.
+
+        Conversations are only classified when a classifier is given and
+        snippets only measured when a ComplexityEngine is given.
+        """
+        columns = self.columns
+        kind_code = self.kinds.code(kind)
+        for source in sources:
+            resolved = bool(is_resolved(source))
+            columns['source_kind'].append(kind_code)
+            columns['source_resolved'].append(resolved)
+            for sharing in source.get('ChatgptSharing', []):
+                if sharing.get('NumberOfPrompts') is not None:
+                    columns['sharing_kind'].append(kind_code)
+                    columns['sharing_resolved'].append(resolved)
+                    columns['sharing_prompts'].append(sharing['NumberOfPrompts'])
+            if classifier is not None:
+                for keyword, state_closed in classified_conversations(source, classifier.classify):
+                    columns['conversation_kind'].append(kind_code)
+                    columns['conversation_resolved'].append(resolved)
+                    columns['conversation_state_closed'].append(state_closed)
+                    columns['conversation_keyword'].append(self.keywords.code(keyword))
+            if engine is not None:
+                for language, code in engine.iter_snippets([source]):
+                    columns['snippet_kind'].append(kind_code)
+                    columns['snippet_language'].append(self.languages.code(language))
+                    columns['snippet_metric'].append(engine.analyze(language, code))
+        self._arrays = None
+
+    def add_metrics(self, kind, metrics):
+        """Append {language: [metric, ...]} results, as returned by ComplexityEngine.scan."""
+        kind_code = self.kinds.code(kind)
+        for language, values in metrics.items():
+            language_code = self.languages.code(language)
+            self.columns['snippet_kind'].extend([kind_code] * len(values))
+            self.columns['snippet_language'].extend([language_code] * len(values))
+            self.columns['snippet_metric'].extend(values)
+        self._arrays = None
+
+    def arrays(self):
+        """NumPy views of the columns, rebuilt after new data is added."""
+        if self._arrays is None:
+            import numpy as np
+
+            self._arrays = {name: np.asarray(values) for name, values in self.columns.items()}
+        return self._arrays
+
+    def type_summaries(self):
+        """{kind: summary} with the keys DataProcessor.aggregate returns, for every kind in one pass."""
+        import numpy as np
+
+        columns = self.arrays()
+        n_kinds, n_keywords = len(self.kinds), len(self.keywords)
+        sources = np.bincount(columns['source_kind'] * 2 + columns['source_resolved'],
+                              minlength=n_kinds * 2).reshape(n_kinds, 2)
+
+        kinds = columns['conversation_kind'].astype(np.int64)
+        keywords = columns['conversation_keyword'].astype(np.int64)
+        group = ((kinds * n_keywords + keywords) * 2 + columns['conversation_resolved']) * 2 \
+            + columns['conversation_state_closed']
+        # counts[kind, keyword, resolved, state_closed]
+        counts = np.bincount(group, minlength=n_kinds * n_keywords * 4).reshape(n_kinds, n_keywords, 2, 2)
+        totals = counts.sum(axis=(2, 3))
+        state_closed = counts[:, :, :, 1].sum(axis=2)
+        resolved = counts[:, :, 1, :].sum(axis=2)
+        unresolved = counts[:, :, 0, :].sum(axis=2)
+        accuracy = np.divide(state_closed, totals, out=np.zeros(totals.shape), where=totals > 0) * 100
+
+        summaries = {}
+        for kind, kind_code in self.kinds.codes.items():
+            # Keywords in first-seen order within the kind, as the dict-based loop listed them
+            seen, first = np.unique(keywords[kinds == kind_code], return_index=True)
+            order = [int(code) for code in seen[np.argsort(first)]]
+            labels = self.keywords.labels
+            total, resolved_sources = int(sources[kind_code].sum()), int(sources[kind_code, 1])
+            summaries[kind] = {
+                'resolved': resolved_sources,
+                'unresolved': total - resolved_sources,
+                'success_percentage': (resolved_sources / total) * 100 if total > 0 else 0,
+                'types': {labels[code]: int(totals[kind_code, code]) for code in order},
+                'accuracy': {labels[code]: float(accuracy[kind_code, code]) for code in order},
+                'resolved_counts': defaultdict(int, {labels[code]: int(resolved[kind_code, code])
+                                                     for code in order if resolved[kind_code, code]}),
+                'unresolved_counts': defaultdict(int, {labels[code]: int(unresolved[kind_code, code])
+                                                       for code in order if unresolved[kind_code, code]}),
+            }
+        return summaries
+
+    def prompt_means(self, kinds):
+        """[[open, closed], ...] rounded mean NumberOfPrompts per kind, as plot_prompt_averages takes."""
+        import numpy as np
+
+        columns = self.arrays()
+        n_kinds = len(self.kinds)
+        group = columns['sharing_kind'].astype(np.int64) * 2 + columns['sharing_resolved']
+        counts = np.bincount(group, minlength=n_kinds * 2).reshape(n_kinds, 2)
+        sums = np.bincount(group, weights=columns['sharing_prompts'], minlength=n_kinds * 2).reshape(n_kinds, 2)
+        series = []
+        for kind in kinds:
+            code = self.kinds.codes.get(kind)
+            if code is None:
+                series.append([0, 0])
+                continue
+            series.append([round(float(sums[code, state]) / int(counts[code, state])) if counts[code, state] else 0
+                           for state in (0, 1)])
+        return series
+
+    def prompt_histograms(self):
+        """{(kind, 'OPEN'|'CLOSED'): counts array indexed by NumberOfPrompts}."""
+        import numpy as np
+
+        columns = self.arrays()
+        prompts = columns['sharing_prompts']
+        length = int(prompts.max()) + 1 if len(prompts) else 0
+        histograms = {}
+        for kind, code in self.kinds.codes.items():
+            for resolved, state in ((0, 'OPEN'), (1, 'CLOSED')):
+                mask = (columns['sharing_kind'] == code) & (columns['sharing_resolved'] == resolved)
+                histograms[(kind, state)] = np.bincount(prompts[mask], minlength=length)
+        return histograms
+
+    def metric_means(self, languages):
+        """Mean snippet metric per language, NaN for languages without snippets."""
+        import numpy as np
+
+        columns = self.arrays()
+        n_languages = len(self.languages)
+        counts = np.bincount(columns['snippet_language'], minlength=n_languages)
+        sums = np.bincount(columns['snippet_language'], weights=columns['snippet_metric'], minlength=n_languages)
+        means = np.divide(sums, counts, out=np.full(n_languages, np.nan), where=counts > 0)
+        return [float(means[self.languages.codes[language]]) if language in self.languages.codes else float('nan')
+                for language in languages]
@@ -0,0 +1,224 @@
+import argparse
+import inspect
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from compact_model import load_compact
+from complexity_engine import ComplexityEngine, LANGUAGE_NAMES
+from query_store import snapshot_kind
+from snapshot_stream import is_available
+
+SNAPSHOT_SUFFIXES = ('.json', '.json.gz', '.json.zst')
+
+
+class NotFound(LookupError):
+    """An unknown query, or a snapshot kind the service has not loaded."""
+
+
+class BadParameter(ValueError):
+    """Query parameters that do not match the query's signature."""
+
+
+class LRUCache:
+    """Thread-safe mapping that evicts the least recently used entry beyond maxsize."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        # Computed outside the lock so one slow query does not block the others
+        value = compute()
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def latest_snapshots(snapshot_dir):
+    """{kind: path} of the newest snapshot file of each kind; dated names sort chronologically."""
+    latest = {}
+    for name in sorted(os.listdir(snapshot_dir)):
+        kind = snapshot_kind(name)
+        if kind is not None and name.endswith(SNAPSHOT_SUFFIXES):
+            latest[kind] = os.path.join(snapshot_dir, name)
+    return latest
+
+
+def _stamp(snapshot_dir):
+    stamps = {}
+    for name in os.listdir(snapshot_dir):
+        stat = os.stat(os.path.join(snapshot_dir, name))
+        stamps[name] = (stat.st_size, stat.st_mtime_ns)
+    return stamps
+
+
+class AnalysisService:
+    """Snapshots held in memory as compact records, with memoized analysis results."""
+
+    def __init__(self, snapshot_dir, cache_size=256, results_cache=None):
+        self.snapshot_dir = snapshot_dir
+        self.results = LRUCache(cache_size)
+        self.engine = ComplexityEngine(cache_path=results_cache)
+        self.data = {}
+        self.paths = {}
+        self.generation = 0
+        self.stamps = None
+        self.reload_lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """(Re)load the newest snapshot of each kind and drop memoized results."""
+        with self.reload_lock:
+            stamps = _stamp(self.snapshot_dir)
+            paths = latest_snapshots(self.snapshot_dir)
+            data = {kind: load_compact(path) for kind, path in paths.items()}
+            # Swapped in whole, so requests see either the old or the new snapshots
+            self.data, self.paths, self.stamps = data, paths, stamps
+            self.generation += 1
+            self.results.clear()
+
+    def changed(self):
+        return _stamp(self.snapshot_dir) != self.stamps
+
+    def watch(self, interval=5.0, stop=None):
+        """Poll the snapshot directory, reloading when a file is added, removed or rewritten."""
+        stop = stop or threading.Event()
+        while not stop.wait(interval):
+            try:
+                if self.changed():
+                    self.reload()
+            except (OSError, ValueError) as error:
+                # A file still being written fails to parse; the next poll retries
+                print(f"Reload of {self.snapshot_dir} failed: {error}")
+
+    def sources(self, kind):
+        if kind not in self.data:
+            raise NotFound(f"no {kind} snapshot under {self.snapshot_dir}")
+        return self.data[kind]
+
+    def query(self, name, params):
+        handler = QUERIES.get(name)
+        if handler is None:
+            raise NotFound(f"unknown query {name}")
+        # Unknown or missing parameters are rejected before any work is done
+        try:
+            inspect.signature(handler).bind(self, **params)
+        except TypeError as error:
+            raise BadParameter(f"{name}: {error}") from error
+        key = (self.generation, name, tuple(sorted(params.items())))
+        return self.results.get(key, lambda: handler(self, **params))
+
+
+def snapshots_query(service):
+    return {'generation': service.generation,
+            'snapshots': {kind: os.path.basename(path) for kind, path in service.paths.items()}}
+
+
+def types_query(service, kind='issue', keyword=()):
+    from keyword_classifier import KeywordClassifier
+    from Ques1 import DataProcessor
+
+    sources = service.sources(kind).filter(lambda source: is_available(source, kind))
+    if kind == 'discussion':
+        is_resolved = lambda discussion: discussion.get('Closed', False)
+    else:
+        is_resolved = lambda source: source.get('State') == 'CLOSED'
+    processor = DataProcessor(None, None, classifier=KeywordClassifier(extra_keywords=keyword))
+    summary = processor.aggregate(sources, is_resolved)
+    summary['resolved_counts'] = dict(summary['resolved_counts'])
+    summary['unresolved_counts'] = dict(summary['unresolved_counts'])
+    return summary
+
+
+def prompts_query(service, kind='pr'):
+    from Ques2 import tally_prompt_counts
+
+    prompt_stats = tally_prompt_counts(service.sources(kind), kind == 'discussion', kind)
+    return {state: prompt_stats[(kind, state)].summary() for state in ('OPEN', 'CLOSED')}
+
+
+def complexity_query(service, kind='commit'):
+    metrics = service.engine.scan(service.sources(kind))
+    return {LANGUAGE_NAMES.get(language, language): {'snippets': len(values),
+                                                     'mean': sum(values) / len(values) if values else None}
+            for language, values in metrics.items()}
+
+
+QUERIES = {
+    'snapshots': snapshots_query,
+    'types': types_query,
+    'prompts': prompts_query,
+    'complexity': complexity_query,
+}
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    """GET /<query>?param=value returns the query's result as JSON."""
+
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] if key != 'keyword' else tuple(values)
+                  for key, values in parse_qs(url.query).items()}
+        try:
+            status, body = 200, self.service.query(url.path.strip('/') or 'snapshots', params)
+        except NotFound as error:
+            status, body = 404, {'error': str(error)}
+        except BadParameter as error:
+            status, body = 400, {'error': str(error)}
+        except Exception as error:
+            # A failing analysis still answers, so clients are not left waiting on a dropped connection
+            status, body = 500, {'error': f'{type(error).__name__}: {error}'}
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve analyses of warm in-memory snapshots over localhost HTTP/JSON')
+    parser.add_argument('--snapshot-dir', default='snapshot')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--cache-size', type=int, default=256, help='memoized query results kept (LRU)')
+    parser.add_argument('--poll-interval', type=float, default=5.0,
+                        help='seconds between checks of the snapshot directory for changes')
+    parser.add_argument('--results-cache', default=None,
+                        help='JSON file persisting per-snippet complexity results across restarts')
+    args = parser.parse_args(argv)
+
+    service = AnalysisService(args.snapshot_dir, args.cache_size, args.results_cache)
+    threading.Thread(target=service.watch, args=(args.poll_interval,), daemon=True).start()
+    AnalysisHandler.service = service
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), AnalysisHandler)
+    print(f"Serving {', '.join(sorted(service.paths))} snapshots on http://127.0.0.1:{args.port}/ "
+          f"({', '.join(QUERIES)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.engine.save_cache()
+
+
+if __name__ == "__main__":
+    main()
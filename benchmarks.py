@@ -0,0 +1,163 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from queue import Empty
+
+from instrumentation import peak_rss_mb
+from synthetic_snapshot import write_snapshot
+
+DEFAULT_SCALES = (1000, 10000, 100000)
+
+
+def _conversation_count(sources):
+    return sum(len(sharing.get('Conversations', [])) for source in sources for sharing in source.get('ChatgptSharing', []))
+
+
+def bench_json_load(paths):
+    with open(paths['issue'], 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    return _conversation_count(data['Sources'])
+
+
+def bench_stream_load(paths):
+    from snapshot_stream import iter_sources
+    return _conversation_count(iter_sources(paths['issue']))
+
+
+def bench_data_processor(paths):
+    from Ques1 import DataProcessor, load_json_file
+    data_processor = DataProcessor(load_json_file(paths['issue']), load_json_file(paths['discussion']))
+    data_processor.clean_data()
+    data_processor.aggregate(data_processor.issues_data, lambda issue: issue['State'] == 'CLOSED')
+    data_processor.aggregate(data_processor.discussions_data, lambda discussion: discussion.get('Closed', False))
+    return _conversation_count(data_processor.issues_data['Sources']) + \
+        _conversation_count(data_processor.discussions_data['Sources'])
+
+
+def bench_preprocess_and_clean(paths):
+    from Ques2 import load_json, preprocess_and_clean
+    data = preprocess_and_clean(load_json(paths['issue']), clean_conversations=True)
+    return _conversation_count(data['Sources'])
+
+
+def bench_issuecategorization(paths):
+    from Ques2 import issuecategorization, load_json
+    data = load_json(paths['pr'])
+    issuecategorization(data)
+    return _conversation_count(data['Sources'])
+
+
+def bench_cyclomatic_complexity(paths):
+    from complexity_engine import calculate_cyclomatic_complexity
+    from snapshot_stream import iter_sources
+    snippets = 0
+    for source in iter_sources(paths['commit']):
+        for sharing in source.get('ChatgptSharing', []):
+            for conversation in sharing.get('Conversations', []):
+                for code_snippet in conversation.get('ListOfCode', []):
+                    calculate_cyclomatic_complexity(code_snippet.get('Content'), code_snippet.get('Type'))
+                    snippets += 1
+    return snippets
+
+
+BENCHMARKS = {
+    'json_load': bench_json_load,
+    'stream_load': bench_stream_load,
+    'data_processor': bench_data_processor,
+    'preprocess_and_clean': bench_preprocess_and_clean,
+    'issuecategorization': bench_issuecategorization,
+    'cyclomatic_complexity': bench_cyclomatic_complexity,
+}
+
+
+def _run_in_child(name, paths, queue):
+    try:
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        records = BENCHMARKS[name](paths)
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        peak_mb = peak_rss_mb()
+        peak_rss_kb = peak_mb * 1024 if peak_mb is not None else None
+        queue.put({'status': 'ok', 'wall_s': wall, 'cpu_s': cpu, 'records': records,
+                   'records_per_s': records / wall if wall else None, 'peak_rss_kb': peak_rss_kb})
+    except ImportError as error:
+        queue.put({'status': 'skipped', 'error': str(error)})
+    except Exception as error:
+        queue.put({'status': 'error', 'error': f'{type(error).__name__}: {error}'})
+
+
+def run_benchmark(name, paths):
+    """Run one benchmark in a fresh process so its peak memory is its own."""
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_in_child, args=(name, paths, queue))
+    process.start()
+    while True:
+        try:
+            result = queue.get(timeout=1)
+            break
+        except Empty:
+            if not process.is_alive():
+                # Killed before reporting, e.g. by the OOM killer
+                result = {'status': 'error', 'error': f'exit code {process.exitcode}'}
+                break
+    process.join()
+    return result
+
+
+def snapshot_paths(data_dir, scale, seed=0):
+    """Generate (or reuse) one synthetic snapshot per kind at the given scale."""
+    os.makedirs(data_dir, exist_ok=True)
+    paths = {}
+    for kind in ('issue', 'pr', 'discussion', 'commit'):
+        path = os.path.join(data_dir, f'synthetic_{scale}_{seed}_{kind}_sharings.json')
+        if not os.path.exists(path):
+            write_snapshot(path + '.tmp', kind, scale, seed)
+            os.replace(path + '.tmp', path)
+        paths[kind] = path
+    return paths
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the analysis entry points on synthetic snapshots')
+    parser.add_argument('--scales', default=','.join(map(str, DEFAULT_SCALES)),
+                        help='comma-separated conversation counts per snapshot, e.g. 1000,100000,10000000')
+    parser.add_argument('--benchmark', action='append', dest='benchmarks', choices=sorted(BENCHMARKS),
+                        help='benchmark to run (repeatable, default: all)')
+    parser.add_argument('--data-dir', default='.benchmark_data', help='where synthetic snapshots are kept')
+    parser.add_argument('--results', default='benchmark_results.jsonl', help='JSON lines file results are appended to')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    commit = _git_commit()
+    started = datetime.now(timezone.utc).isoformat()
+    with open(args.results, 'a', encoding='utf-8') as results_file:
+        for scale in (int(float(scale)) for scale in args.scales.split(',')):
+            paths = snapshot_paths(args.data_dir, scale, args.seed)
+            for name in args.benchmarks or BENCHMARKS:
+                result = run_benchmark(name, paths)
+                result.update({'benchmark': name, 'scale': scale, 'commit': commit, 'started': started,
+                               'python': platform.python_version()})
+                results_file.write(json.dumps(result) + '\n')
+                results_file.flush()
+                if result['status'] == 'ok':
+                    peak = f"{result['peak_rss_kb'] / 1024:8.1f} MB" if result['peak_rss_kb'] is not None else '   ? MB'
+                    print(f"{name:24} {scale:>10} {result['wall_s']:9.3f}s {result['records_per_s']:12.0f} rec/s {peak}")
+                else:
+                    print(f"{name:24} {scale:>10} {result['status']}: {result['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+MANIFEST_NAME = 'charts.json'
+
+
+def use_headless_backend():
+    """Switch matplotlib to the non-interactive Agg backend."""
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def chart_hash(plot_function, args, kwargs, formats):
+    """Hash of a chart's plotting function, plotted data and output formats."""
+    payload = json.dumps([plot_function.__qualname__, args, kwargs, list(formats)], sort_keys=True, default=repr)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _render(plot_function, args, kwargs, paths):
+    use_headless_backend()
+    import matplotlib.pyplot as plt
+    fig = plot_function(*args, show=False, **kwargs)
+    for path in paths:
+        fig.savefig(path, bbox_inches='tight')
+    plt.close(fig)
+    return paths
+
+
+class ChartRenderer:
+    """Render charts headlessly to files in worker processes, skipping unchanged ones.
+
+    Plot functions must accept show=False and return their figure.
+    """
+
+    def __init__(self, output_dir, formats=('png',), max_workers=None):
+        self.output_dir = output_dir
+        self.formats = tuple(formats)
+        self.max_workers = max_workers
+        os.makedirs(output_dir, exist_ok=True)
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as manifest_file:
+                self.manifest = json.load(manifest_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.manifest = {}
+        self.statuses = {}
+        self._pending = {}
+        self._executor = None
+        use_headless_backend()
+
+    def submit(self, name, plot_function, *args, **kwargs):
+        """Queue a chart for rendering unless its data is unchanged since the last run."""
+        digest = chart_hash(plot_function, args, kwargs, self.formats)
+        paths = [os.path.join(self.output_dir, f'{name}.{extension}') for extension in self.formats]
+        if self.manifest.get(name) == digest and all(os.path.exists(path) for path in paths):
+            self.statuses[name] = 'unchanged'
+            return
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._pending[name] = (self._executor.submit(_render, plot_function, args, kwargs, paths), digest)
+
+    def close(self):
+        """Wait for queued charts, record their hashes and return each chart's status."""
+        for name, (future, digest) in self._pending.items():
+            future.result()
+            self.manifest[name] = digest
+            self.statuses[name] = 'rendered'
+        self._pending = {}
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        with open(self.manifest_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=2, sort_keys=True)
+        return self.statuses
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
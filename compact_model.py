@@ -0,0 +1,113 @@
+import sys
+from array import array
+
+from snapshot_stream import iter_sources
+
+# Marks a field absent from the snapshot, so lookups fail like a missing dict key
+_MISSING = object()
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Record:
+    """Slotted record readable like the dict it was built from.
+
+    FIELDS maps snapshot keys to attribute names; only those fields are kept.
+    """
+
+    __slots__ = ()
+    FIELDS = {}
+
+    def __getitem__(self, key):
+        value = getattr(self, self.FIELDS[key]) if key in self.FIELDS else _MISSING
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        setattr(self, self.FIELDS[key], value)
+
+    def __contains__(self, key):
+        return key in self.FIELDS and getattr(self, self.FIELDS[key]) is not _MISSING
+
+    def get(self, key, default=None):
+        value = getattr(self, self.FIELDS[key]) if key in self.FIELDS else _MISSING
+        return default if value is _MISSING else value
+
+    def keys(self):
+        return [key for key in self.FIELDS if key in self]
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict((key, self[key]) for key in self.keys())!r})'
+
+
+class CodeSnippet(Record):
+    __slots__ = ('type', 'content')
+    FIELDS = {'Type': 'type', 'Content': 'content'}
+
+    def __init__(self, code_snippet):
+        self.type = _intern(code_snippet.get('Type', _MISSING))
+        self.content = code_snippet.get('Content', _MISSING)
+
+
+class Conversation(Record):
+    __slots__ = ('prompt', 'answer', 'code')
+    FIELDS = {'Prompt': 'prompt', 'Answer': 'answer', 'ListOfCode': 'code'}
+
+    def __init__(self, conversation):
+        self.prompt = conversation.get('Prompt', _MISSING)
+        self.answer = conversation.get('Answer', _MISSING)
+        self.code = tuple(CodeSnippet(code_snippet) for code_snippet in conversation.get('ListOfCode', ()))
+
+
+class Sharing(Record):
+    __slots__ = ('number_of_prompts', 'status', 'conversations')
+    FIELDS = {'NumberOfPrompts': 'number_of_prompts', 'Status': 'status', 'Conversations': 'conversations'}
+
+    def __init__(self, sharing):
+        self.number_of_prompts = sharing.get('NumberOfPrompts', _MISSING)
+        self.status = sharing.get('Status', _MISSING)
+        self.conversations = tuple(Conversation(conversation) for conversation in sharing.get('Conversations', ()))
+
+
+class Source(Record):
+    __slots__ = ('url', 'state', 'closed', 'status', 'sharings')
+    FIELDS = {'URL': 'url', 'State': 'state', 'Closed': 'closed', 'Status': 'status', 'ChatgptSharing': 'sharings'}
+
+    def __init__(self, source):
+        self.url = source.get('URL', _MISSING)
+        self.state = _intern(source.get('State', _MISSING))
+        self.closed = source.get('Closed', _MISSING)
+        self.status = source.get('Status', _MISSING)
+        self.sharings = tuple(Sharing(sharing) for sharing in source.get('ChatgptSharing', ()))
+
+
+class CompactSources:
+    """Sources held as slotted records; filter returns an index view over the same records."""
+
+    def __init__(self, records, indices=None):
+        self.records = records
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.records) if self.indices is None else len(self.indices)
+
+    def __iter__(self):
+        if self.indices is None:
+            return iter(self.records)
+        return (self.records[index] for index in self.indices)
+
+    def __getitem__(self, position):
+        return self.records[position if self.indices is None else self.indices[position]]
+
+    def filter(self, predicate):
+        positions = range(len(self.records)) if self.indices is None else self.indices
+        return CompactSources(self.records, array('q', (index for index in positions
+                                                        if predicate(self.records[index]))))
+
+
+def load_compact(file_path):
+    """Stream a snapshot into compact records, keeping only the fields the analyses read."""
+    return CompactSources([Source(source) for source in iter_sources(file_path)])
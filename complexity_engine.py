@@ -0,0 +1,186 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+
+from instrumentation import timed_stage
+from snapshot_cache import open_cached_snapshot
+from snapshot_stream import SnapshotSources
+
+CACHE_VERSION = 2
+
+# Display names for snippet Types, in the order the charts list them
+LANGUAGE_NAMES = {'javascript': 'JavaScript', 'java': 'Java', 'python': 'Python'}
+
+# Comments and string literals are matched first so keywords inside them are skipped
+_C_LIKE_TOKENS = re.compile(r'''
+    /\*.*?\*/ | //[^\n]*
+  | "(?:\\.|[^"\\\n])*" | '(?:\\.|[^'\\\n])*' | `(?:\\.|[^`\\])*`
+  | [<,]\s*\?(?=\s*(?:[>,]|extends\b|super\b))  # Java generic wildcard in any type argument, not a ternary
+  | \?\.(?!\d)                              # optional chaining
+  | (?P<decision>\b(?:if|for|while|case|catch)\b | &&=? | \|\|=? | \?\?=? | \?)
+''', re.S | re.X)
+
+_PYTHON_TOKENS = re.compile(r"""
+    \#[^\n]*
+  | [rRbBuUfF]{0,2}(?:'{3}(?:\\.|[^\\])*?'{3} | "{3}(?:\\.|[^\\])*?"{3})
+  | [rRbBuUfF]{0,2}(?:"(?:\\.|[^"\\\n])*" | '(?:\\.|[^'\\\n])*')
+  | (?P<decision>\b(?:if|elif|for|while|except|and|or)\b)
+""", re.S | re.X)
+
+
+def _count_decisions(pattern, code):
+    return 1 + sum(1 for match in pattern.finditer(code) if match.group('decision'))
+
+
+def c_like_complexity(code):
+    """Cyclomatic complexity of Java/JavaScript code from a single tokenizing pass.
+
+    Counts 1 plus each if, for, while, case, catch, &&, ||, ?? and ternary ?,
+    skipping comments, string literals, Java wildcards and optional chaining.
+    JavaScript regex literals are not recognized, so a ? inside one (/a?b/)
+    is counted as a ternary.
+    """
+    return _count_decisions(_C_LIKE_TOKENS, code or '')
+
+
+def python_complexity(code):
+    """Cyclomatic complexity of Python code using radon, tokenizing fragments radon cannot parse."""
+    from radon.visitors import ComplexityVisitor
+
+    try:
+        return ComplexityVisitor.from_code(code or '').total_complexity
+    except (SyntaxError, ValueError, RecursionError):
+        return _count_decisions(_PYTHON_TOKENS, code or '')
+
+
+DEFAULT_ANALYZERS = {'javascript': c_like_complexity, 'java': c_like_complexity, 'python': python_complexity}
+
+
+def calculate_cyclomatic_complexity(code, language='java'):
+    """Cyclomatic complexity of code with the analyzer registered for language."""
+    return DEFAULT_ANALYZERS.get(language, c_like_complexity)(code)
+
+
+def snippet_key(analyzer, language, code):
+    """Key of a snippet's analysis result: the analyzer, the language and a hash of the content."""
+    digest = hashlib.sha1((code or '').encode('utf-8')).hexdigest()
+    return f'{analyzer.__qualname__}:{language}:{digest}'
+
+
+class ComplexityEngine:
+    """Measure every registered language's ListOfCode snippets in a single scan of Sources."""
+
+    def __init__(self, analyzers=None, cache_path=None):
+        # Results keyed by snippet content hash, so repeated code is analyzed once
+        self.results = {}
+        self.cache_path = cache_path
+        if cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as cache_file:
+                saved = json.load(cache_file)
+            if saved.get('version') == CACHE_VERSION:
+                self.results = saved['results']
+
+        self.analyzers = {}
+        for language, analyzer in (DEFAULT_ANALYZERS if analyzers is None else analyzers).items():
+            self.register(language, analyzer)
+
+    def register(self, language, analyzer):
+        """Measure snippets whose Type is language with analyzer(code) on the next scan."""
+        self.analyzers[language] = analyzer
+
+    def analyze(self, language, code):
+        analyzer = self.analyzers[language]
+        key = snippet_key(analyzer, language, code)
+        metric = self.results.get(key)
+        if metric is None:
+            metric = self.results[key] = analyzer(code)
+        return metric
+
+    def save_cache(self):
+        """Persist analysis results so later runs and snapshots reuse them."""
+        if self.cache_path is None:
+            return
+        temp_path = self.cache_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as cache_file:
+            json.dump({'version': CACHE_VERSION, 'results': self.results}, cache_file)
+        os.replace(temp_path, self.cache_path)
+
+    def iter_snippets(self, sources):
+        for source in sources:
+            for chatgpt_sharing in source.get("ChatgptSharing", []):
+                for conversation in chatgpt_sharing.get("Conversations", []):
+                    for code_snippet in conversation.get("ListOfCode", []):
+                        language = code_snippet.get("Type")
+                        if language in self.analyzers:
+                            yield language, code_snippet.get("Content")
+
+    def scan(self, sources, on_snippet=None):
+        """Return {language: [metric, ...]} for every registered language.
+
+        on_snippet(language, code, metric) is called for each measured snippet.
+        """
+        return self.scan_snippets(self.iter_snippets(sources), on_snippet)
+
+    @timed_stage('ComplexityEngine.scan', records=lambda metrics: sum(map(len, metrics.values())))
+    def scan_snippets(self, snippets, on_snippet=None):
+        """Like scan, over (Type, Content) pairs such as QueryStore.snippets returns."""
+        metrics = {language: [] for language in self.analyzers}
+        for language, code in snippets:
+            if language not in metrics:
+                continue
+            metric = self.analyze(language, code)
+            metrics[language].append(metric)
+            if on_snippet is not None:
+                on_snippet(language, code, metric)
+        return metrics
+
+
+def plot_mean_metrics(languages, mean_metrics, show=True):
+    import matplotlib.pyplot as plt
+
+    # Plotting using matplotlib bar graph
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.bar(languages, mean_metrics, color=['blue', 'orange', 'green'])
+    ax.set_title('Comparison of Mean Metrics for Each Language')
+    ax.set_ylabel('Mean Metric Values')
+
+    if show:
+        plt.show()
+    return fig
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cyclomatic complexity of shared code snippets per language')
+    parser.add_argument('file_path', help='snapshot *_sharings.json file')
+    parser.add_argument('--language', action='append', dest='languages',
+                        help='snippet Type to measure (repeatable, default: %s)' % ', '.join(LANGUAGE_NAMES))
+    parser.add_argument('--results-cache', default=None,
+                        help='JSON file persisting per-snippet results across runs and snapshots')
+    parser.add_argument('--cache', action='store_true',
+                        help='read the snapshot through the memory-mapped columnar cache, building it on first use')
+    parser.add_argument('--store', default=None,
+                        help='read snippets through this SQLite query store, ingesting the snapshot on first use')
+    args = parser.parse_args(argv)
+
+    analyzers = None
+    if args.languages:
+        analyzers = {language: DEFAULT_ANALYZERS.get(language, c_like_complexity) for language in args.languages}
+    engine = ComplexityEngine(analyzers, cache_path=args.results_cache)
+    if args.store:
+        from query_store import QueryStore
+
+        with QueryStore(args.store) as store:
+            store.open_snapshot(args.file_path)
+            metrics = engine.scan_snippets(store.snippets(engine.analyzers, snapshot=os.path.basename(args.file_path)))
+    else:
+        metrics = engine.scan(open_cached_snapshot(args.file_path) if args.cache else SnapshotSources(args.file_path))
+    engine.save_cache()
+    for language, values in metrics.items():
+        mean = sum(values) / len(values) if values else 0
+        print(f"{LANGUAGE_NAMES.get(language, language)}: {len(values)} snippets, mean complexity {mean:.2f}")
+
+
+if __name__ == "__main__":
+    main()
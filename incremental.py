@@ -0,0 +1,199 @@
+import argparse
+import hashlib
+import json
+import os
+
+from complexity_engine import ComplexityEngine
+from keyword_classifier import KeywordClassifier
+from snapshot_stream import is_available, iter_sources
+
+STATE_VERSION = 1
+KINDS = ('issue', 'pr', 'discussion', 'commit', 'file', 'hn')
+
+
+def source_id(source):
+    """Stable identity of a source across dated snapshots: its URL, else a hash of its content."""
+    return source.get('URL') or 'sha1:' + source_fingerprint(source)
+
+
+def source_fingerprint(source):
+    return hashlib.sha1(json.dumps(source, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def is_closed(source, kind):
+    if kind == 'discussion':
+        return bool(source.get('Closed', False))
+    return source.get('State') == 'CLOSED'
+
+
+def source_contribution(source, kind, classifier, engine):
+    """Everything one source adds to the aggregates, so it can later be subtracted again."""
+    types = {}
+    prompts = []
+    for sharing in source.get('ChatgptSharing', []):
+        if sharing.get('NumberOfPrompts') is not None:
+            prompts.append(sharing['NumberOfPrompts'])
+        for conversation in sharing.get('Conversations', []):
+            keyword = classifier.classify(conversation.get('Prompt', ''), conversation.get('Answer', ''))
+            if keyword is not None:
+                types[keyword] = types.get(keyword, 0) + 1
+    complexity = {}
+    for language, code in engine.iter_snippets([source]):
+        complexity.setdefault(language, []).append(engine.analyze(language, code))
+    return {'closed': is_closed(source, kind), 'types': types, 'prompts': prompts, 'complexity': complexity}
+
+
+def empty_aggregates():
+    return {
+        'sources': {'OPEN': 0, 'CLOSED': 0},
+        'types': {'OPEN': {}, 'CLOSED': {}},
+        'prompts': {'OPEN': {}, 'CLOSED': {}},
+        'complexity': {},
+    }
+
+
+def _bump(counts, key, amount):
+    key = str(key)
+    counts[key] = counts.get(key, 0) + amount
+    if not counts[key]:
+        del counts[key]
+
+
+def fold(aggregates, contribution, sign=1):
+    """Add (sign=1) or remove (sign=-1) one source's contribution.
+
+    Prompt counts and complexity are kept as value histograms, so removal is exact.
+    """
+    state = 'CLOSED' if contribution['closed'] else 'OPEN'
+    aggregates['sources'][state] += sign
+    for keyword, count in contribution['types'].items():
+        _bump(aggregates['types'][state], keyword, sign * count)
+    for prompts in contribution['prompts']:
+        _bump(aggregates['prompts'][state], prompts, sign)
+    for language, metrics in contribution['complexity'].items():
+        histogram = aggregates['complexity'].setdefault(language, {})
+        for metric in metrics:
+            _bump(histogram, metric, sign)
+
+
+def load_state(state_path, kind):
+    if state_path and os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as state_file:
+            state = json.load(state_file)
+        if state.get('version') == STATE_VERSION and state.get('kind') == kind:
+            return state
+    return {'version': STATE_VERSION, 'kind': kind, 'snapshot': None, 'sources': {}, 'aggregates': empty_aggregates()}
+
+
+def save_state(state, state_path):
+    temp_path = state_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file)
+    os.replace(temp_path, state_path)
+
+
+def update(state, sources, classifier=None, engine=None):
+    """Fold the differences between the stored sources and a new snapshot into the aggregates.
+
+    Only new and changed sources are classified and measured. Sources that were
+    gone (Status 404) are left out, as DataProcessor.clean_data drops them, and
+    count as removed if they were stored before. Returns the number of new,
+    changed, removed and unchanged sources.
+    """
+    classifier = classifier if classifier is not None else KeywordClassifier()
+    engine = engine if engine is not None else ComplexityEngine()
+    kind = state['kind']
+    previous = state['sources']
+    aggregates = state['aggregates']
+    changes = {'new': 0, 'changed': 0, 'removed': 0, 'unchanged': 0}
+    seen = set()
+
+    for source in sources:
+        if not is_available(source, kind):
+            continue
+        identity = source_id(source)
+        duplicate = 1
+        while identity in seen:
+            duplicate += 1
+            identity = f'{source_id(source)}#{duplicate}'
+        seen.add(identity)
+
+        fingerprint = source_fingerprint(source)
+        entry = previous.get(identity)
+        if entry is not None and entry['fingerprint'] == fingerprint:
+            changes['unchanged'] += 1
+            continue
+        if entry is not None:
+            fold(aggregates, entry['contribution'], -1)
+            changes['changed'] += 1
+        else:
+            changes['new'] += 1
+        contribution = source_contribution(source, kind, classifier, engine)
+        fold(aggregates, contribution)
+        previous[identity] = {'fingerprint': fingerprint, 'contribution': contribution}
+
+    for identity in [identity for identity in previous if identity not in seen]:
+        fold(aggregates, previous.pop(identity)['contribution'], -1)
+        changes['removed'] += 1
+    return changes
+
+
+def histogram_summary(histogram):
+    """Count, mean, min/max and median of a {value: count} histogram."""
+    values = sorted((float(value), count) for value, count in histogram.items())
+    total = sum(count for _, count in values)
+    if not total:
+        return {'count': 0, 'mean': None, 'min': None, 'max': None, 'median': None}
+    seen = 0
+    median = None
+    for value, count in values:
+        seen += count
+        if seen * 2 >= total:
+            median = value
+            break
+    return {
+        'count': total,
+        'mean': sum(value * count for value, count in values) / total,
+        'min': values[0][0],
+        'max': values[-1][0],
+        'median': median,
+    }
+
+
+def summarize(aggregates):
+    sources = aggregates['sources']
+    total = sources['OPEN'] + sources['CLOSED']
+    keywords = set(aggregates['types']['OPEN']) | set(aggregates['types']['CLOSED'])
+    types = {}
+    for keyword in sorted(keywords):
+        resolved = aggregates['types']['CLOSED'].get(keyword, 0)
+        unresolved = aggregates['types']['OPEN'].get(keyword, 0)
+        types[keyword] = {'resolved': resolved, 'unresolved': unresolved,
+                          'accuracy': resolved / (resolved + unresolved) * 100}
+    return {
+        'sources': total,
+        'success_percentage': sources['CLOSED'] / total * 100 if total else 0,
+        'types': types,
+        'prompts': {state: histogram_summary(histogram) for state, histogram in aggregates['prompts'].items()},
+        'complexity': {language: histogram_summary(histogram)
+                       for language, histogram in aggregates['complexity'].items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fold a new dated snapshot into persisted aggregates')
+    parser.add_argument('file_path', help='the newest *_sharings.json snapshot')
+    parser.add_argument('--kind', choices=KINDS, required=True)
+    parser.add_argument('--state', required=True, help='JSON file holding the per-source index and aggregates')
+    args = parser.parse_args(argv)
+
+    state = load_state(args.state, args.kind)
+    changes = update(state, iter_sources(args.file_path))
+    state['snapshot'] = os.path.basename(args.file_path)
+    save_state(state, args.state)
+    print(', '.join(f'{count} {change}' for change, count in changes.items()))
+    print(json.dumps(summarize(state['aggregates']), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import atexit
+import cProfile
+import csv
+import functools
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# SEPROJECT_PROFILE=report.json (or .csv) turns instrumentation on at import time
+_ENV_REPORT = 'SEPROJECT_PROFILE'
+_ENV_CPROFILE = 'SEPROJECT_CPROFILE'
+
+
+class _State:
+    enabled = False
+    report_path = None
+    profile_path = None
+    profiler = None
+    stages = {}
+    registered = False
+
+
+def enable(report_path=None, profile_path=None):
+    """Start recording stages; write the report (and cProfile dump) when the process exits."""
+    _State.enabled = True
+    _State.report_path = report_path
+    _State.profile_path = profile_path
+    if profile_path and _State.profiler is None:
+        _State.profiler = cProfile.Profile()
+        _State.profiler.enable()
+    if not _State.registered:
+        atexit.register(write_report)
+        _State.registered = True
+
+
+def is_enabled():
+    return _State.enabled
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far in MB, or None where it cannot be read."""
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memory = psutil.Process().memory_info()
+    # peak_wset is the peak working set on Windows
+    return getattr(memory, 'peak_wset', memory.rss) / (1024 * 1024)
+
+
+class StageTimer:
+    """Context manager timing one run of a stage; call add(n) to count processed records.
+
+    peak_rss_growth_mb is how far the stage raised the process's peak RSS above
+    the peak at stage entry (the largest over all calls), so 0 means it never
+    needed more memory than earlier work; process_peak_rss_mb is the process-wide
+    peak when the stage last finished.
+    """
+
+    __slots__ = ('name', 'records', '_wall', '_cpu', '_peak')
+
+    def __init__(self, name):
+        self.name = name
+        self.records = 0
+
+    def add(self, count=1):
+        self.records += count
+
+    def __enter__(self):
+        self._peak = peak_rss_mb()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        peak = peak_rss_mb()
+        totals = _State.stages.setdefault(self.name, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'records': 0,
+                                                      'peak_rss_growth_mb': None, 'process_peak_rss_mb': None})
+        totals['calls'] += 1
+        totals['wall_s'] += wall
+        totals['cpu_s'] += cpu
+        totals['records'] += self.records
+        if peak is not None:
+            growth = peak - self._peak
+            totals['peak_rss_growth_mb'] = max(growth, totals['peak_rss_growth_mb'] or 0.0)
+            totals['process_peak_rss_mb'] = peak
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def add(self, count=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name):
+    """Time a block as the named stage; a shared no-op when instrumentation is off."""
+    return StageTimer(name) if _State.enabled else _NULL_STAGE
+
+
+def timed_stage(name=None, records=None):
+    """Decorator timing every call as a stage.
+
+    records(result) may return how many records the call processed.
+    """
+    def decorator(function):
+        stage_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _State.enabled:
+                return function(*args, **kwargs)
+            with StageTimer(stage_name) as timer:
+                result = function(*args, **kwargs)
+                if records is not None:
+                    timer.add(records(result))
+            return result
+        return wrapper
+    return decorator
+
+
+def report():
+    """Per-stage totals with derived records per second."""
+    rows = []
+    for name, totals in _State.stages.items():
+        row = dict(totals, stage=name)
+        row['records_per_s'] = totals['records'] / totals['wall_s'] if totals['records'] and totals['wall_s'] else None
+        rows.append(row)
+    return rows
+
+
+def write_report(report_path=None):
+    report_path = report_path or _State.report_path
+    if _State.profiler is not None:
+        _State.profiler.disable()
+        _State.profiler.dump_stats(_State.profile_path)
+        _State.profiler = None
+    rows = report()
+    if not rows or not report_path:
+        return
+    if report_path.endswith('.csv'):
+        fields = ['stage', 'calls', 'wall_s', 'cpu_s', 'records', 'records_per_s', 'peak_rss_growth_mb',
+                  'process_peak_rss_mb']
+        with open(report_path, 'w', newline='', encoding='utf-8') as report_file:
+            writer = csv.DictWriter(report_file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(report_path, 'w', encoding='utf-8') as report_file:
+            json.dump(rows, report_file, indent=2)
+
+
+if os.environ.get(_ENV_REPORT):
+    enable(os.environ[_ENV_REPORT], os.environ.get(_ENV_CPROFILE))
@@ -0,0 +1,83 @@
+import re
+
+DEFAULT_KEYWORDS = ['code', 'bug', 'error', 'feature', 'what is']
+
+
+def _trie_pattern(node):
+    # Render a character trie as a regex so a match costs one branch per character, not one per keyword
+    if not node:
+        return ''
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        # A keyword ends here; greedily try to extend to a longer keyword first
+        if len(branches) == 1 and len(pattern) > 1:
+            pattern = '(?:' + pattern + ')'
+        pattern += '?'
+    return pattern
+
+
+class KeywordClassifier:
+    """Pick the dominant taxonomy keyword of a prompt/answer pair in one scan per text."""
+
+    def __init__(self, keywords=None, extra_keywords=()):
+        taxonomy = []
+        for keyword in list(keywords if keywords is not None else DEFAULT_KEYWORDS) + list(extra_keywords):
+            keyword = keyword.lower()
+            if keyword and keyword not in taxonomy:
+                taxonomy.append(keyword)
+        if not taxonomy:
+            raise ValueError("KeywordClassifier needs at least one keyword.")
+        self.keywords = taxonomy
+        self._rank = {keyword: index for index, keyword in enumerate(taxonomy)}
+
+        trie = {}
+        for keyword in taxonomy:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = {}
+        # The lookahead lets matches overlap, so keywords inside other keywords are still seen
+        self._pattern = re.compile('(?=(' + _trie_pattern(trie) + '))')
+
+        # A match of one keyword implies every keyword that is a prefix of it matched too
+        self._implied = {
+            keyword: [other for other in taxonomy if keyword.startswith(other)]
+            for keyword in taxonomy
+        }
+
+    def keywords_in(self, text):
+        """Return the set of taxonomy keywords occurring in text, case-insensitively."""
+        found = set()
+        if not text:
+            return found
+        for match in self._pattern.finditer(text.lower()):
+            found.update(self._implied[match.group(1)])
+            if len(found) == len(self.keywords):
+                break
+        return found
+
+    def classify(self, prompt, answer):
+        """Return the keyword found in most of prompt and answer, earliest in the taxonomy on ties."""
+        in_prompt = self.keywords_in(prompt)
+        in_answer = self.keywords_in(answer)
+        if not in_prompt and not in_answer:
+            return None
+        return max(in_prompt | in_answer,
+                   key=lambda keyword: ((keyword in in_prompt) + (keyword in in_answer), -self._rank[keyword]))
+
+
+def classified_conversations(source, classify):
+    """Yield (keyword, State is CLOSED) for each conversation of source that classify(prompt, answer) labels.
+
+    Per-type accuracy has always been keyed on State, for discussions too, so
+    the flag is read from State whatever the source's kind.
+    """
+    state_closed = source.get('State', 'OPEN') == 'CLOSED'
+    for sharing in source.get('ChatgptSharing', []):
+        for conversation in sharing.get('Conversations', []):
+            keyword = classify(conversation.get('Prompt', ''), conversation.get('Answer', ''))
+            if keyword is not None:
+                yield keyword, state_closed
@@ -0,0 +1,158 @@
+import math
+from collections import defaultdict
+
+
+class QuantileSketch:
+    """Mergeable log-bucketed quantile sketch with bounded relative error (DDSketch)."""
+
+    def __init__(self, relative_accuracy=0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1.")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.positive = defaultdict(int)
+        self.negative = defaultdict(int)
+        self.zero_count = 0
+        self.count = 0
+
+    def _index(self, magnitude):
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _value(self, index):
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def add(self, value, count=1):
+        if value > 0:
+            self.positive[self._index(value)] += count
+        elif value < 0:
+            self.negative[self._index(-value)] += count
+        else:
+            self.zero_count += count
+        self.count += count
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy.")
+        for index, count in other.positive.items():
+            self.positive[index] += count
+        for index, count in other.negative.items():
+            self.negative[index] += count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q):
+        """Approximate q-quantile (0 <= q <= 1), or None when empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return -self._value(index)
+        seen += self.zero_count
+        if seen > rank:
+            return 0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self.positive))
+
+
+class StreamingStats:
+    """Constant-memory running count, sum, min/max, variance and quantiles."""
+
+    def __init__(self, relative_accuracy=0.01):
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+        # Welford's update keeps the variance numerically stable
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.sketch.add(value)
+
+    def add_many(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        if not other.count:
+            return self
+        if not self.count:
+            self.mean, self._m2 = other.mean, other._m2
+        else:
+            # Chan et al. pairwise combination of means and squared deviations
+            count = self.count + other.count
+            delta = other.mean - self.mean
+            self._m2 += other._m2 + delta * delta * self.count * other.count / count
+            self.mean += delta * other.count / count
+        self.count += other.count
+        self.total += other.total
+        self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+        self.maximum = other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+        self.sketch.merge(other.sketch)
+        return self
+
+    @property
+    def variance(self):
+        """Population variance, 0 when fewer than two values were seen."""
+        return self._m2 / self.count if self.count > 1 else 0.0
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    def average(self):
+        """Rounded mean, matching calculate_average in Ques2."""
+        return round(self.total / self.count) if self.count else 0
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'min': self.minimum,
+            'max': self.maximum,
+            'mean': self.mean if self.count else None,
+            'variance': self.variance,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+        }
+
+
+class PromptCountStats:
+    """StreamingStats of NumberOfPrompts grouped by (source type, state)."""
+
+    def __init__(self):
+        self.groups = {}
+
+    def add_many(self, key, values):
+        stats = self.groups.get(key)
+        if stats is None:
+            stats = self.groups[key] = StreamingStats()
+        stats.add_many(values)
+
+    def __getitem__(self, key):
+        return self.groups.get(key) or StreamingStats()
+
+    def merge(self, other):
+        for key, stats in other.groups.items():
+            if key not in self.groups:
+                self.groups[key] = StreamingStats(stats.sketch.relative_accuracy)
+            self.groups[key].merge(stats)
+        return self
+
+    def summary(self):
+        return {f'{source_type}/{state}': stats.summary() for (source_type, state), stats in self.groups.items()}
@@ -0,0 +1,267 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+
+from snapshot_stream import FilteredSources, iter_sources
+
+STORE_VERSION = 1
+
+# DevGPT snapshot names end in <kind>_sharings.json, e.g. 20230831_061759_issue_sharings.json
+_KIND_PATTERN = re.compile(r'_(pr|issue|discussion|commit|file|hn)_sharings\.json')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    kind TEXT,
+    size INTEGER,
+    mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots(id),
+    kind TEXT,
+    url TEXT,
+    state TEXT,
+    closed INTEGER,
+    status INTEGER,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sharings (
+    id INTEGER PRIMARY KEY,
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    number_of_prompts INTEGER,
+    status INTEGER
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY,
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    sharing_id INTEGER NOT NULL REFERENCES sharings(id),
+    prompt TEXT,
+    answer TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS conversation_text USING fts5(
+    prompt, answer, content='conversations', content_rowid='id'
+);
+CREATE TABLE IF NOT EXISTS snippets (
+    id INTEGER PRIMARY KEY,
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    conversation_id INTEGER NOT NULL REFERENCES conversations(id),
+    type TEXT,
+    content TEXT
+);
+CREATE INDEX IF NOT EXISTS sources_kind_state ON sources(kind, state);
+CREATE INDEX IF NOT EXISTS sources_kind_closed ON sources(kind, closed);
+CREATE INDEX IF NOT EXISTS sources_snapshot ON sources(snapshot_id);
+CREATE INDEX IF NOT EXISTS sharings_prompts ON sharings(number_of_prompts, source_id);
+CREATE INDEX IF NOT EXISTS sharings_source ON sharings(source_id);
+CREATE INDEX IF NOT EXISTS conversations_source ON conversations(source_id);
+CREATE INDEX IF NOT EXISTS snippets_type ON snippets(type, source_id);
+CREATE INDEX IF NOT EXISTS snippets_source ON snippets(source_id);
+'''
+
+
+def snapshot_kind(file_path):
+    """The source kind a DevGPT snapshot file holds, read from its name."""
+    match = _KIND_PATTERN.search(os.path.basename(file_path))
+    return match.group(1) if match else None
+
+
+def _int_or_none(value):
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+class StoredSources:
+    """Re-iterable query result that yields Sources-style dicts, like SnapshotSources."""
+
+    def __init__(self, store, sql, params):
+        self.store = store
+        self.sql = sql
+        self.params = params
+
+    def __iter__(self):
+        for body, in self.store.connection.execute(self.sql, self.params):
+            yield json.loads(body)
+
+    def __len__(self):
+        return self.store.connection.execute(f'SELECT count(*) FROM ({self.sql})', self.params).fetchone()[0]
+
+    def filter(self, predicate):
+        return FilteredSources(self, predicate)
+
+
+class QueryStore:
+    """SQLite store of ingested snapshots, indexed for filtered analyses without rescanning JSON."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, STORE_VERSION):
+            raise ValueError(f'{db_path} was written by query store version {version}, expected {STORE_VERSION}')
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f'PRAGMA user_version = {STORE_VERSION}')
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def is_ingested(self, file_path):
+        stat = os.stat(file_path)
+        row = self.connection.execute('SELECT size, mtime_ns FROM snapshots WHERE name = ?',
+                                      (os.path.basename(file_path),)).fetchone()
+        return row == (stat.st_size, stat.st_mtime_ns)
+
+    def _remove_snapshot(self, snapshot_id):
+        execute = self.connection.execute
+        source_ids = 'SELECT id FROM sources WHERE snapshot_id = ?'
+        # External-content FTS rows are removed by replaying the indexed values
+        execute("INSERT INTO conversation_text(conversation_text, rowid, prompt, answer) "
+                f"SELECT 'delete', id, prompt, answer FROM conversations WHERE source_id IN ({source_ids})",
+                (snapshot_id,))
+        for table in ('snippets', 'conversations', 'sharings'):
+            execute(f'DELETE FROM {table} WHERE source_id IN ({source_ids})', (snapshot_id,))
+        execute('DELETE FROM sources WHERE snapshot_id = ?', (snapshot_id,))
+        execute('DELETE FROM snapshots WHERE id = ?', (snapshot_id,))
+
+    def ingest(self, file_path, kind=None):
+        """Load (or reload) one snapshot file, replacing rows from an earlier ingest of it."""
+        name = os.path.basename(file_path)
+        kind = kind or snapshot_kind(file_path)
+        stat = os.stat(file_path)
+        execute = self.connection.execute
+        with self.connection:
+            previous = execute('SELECT id FROM snapshots WHERE name = ?', (name,)).fetchone()
+            if previous is not None:
+                self._remove_snapshot(previous[0])
+            snapshot_id = execute('INSERT INTO snapshots (name, kind, size, mtime_ns) VALUES (?, ?, ?, ?)',
+                                  (name, kind, stat.st_size, stat.st_mtime_ns)).lastrowid
+            for source in iter_sources(file_path):
+                closed = source.get('Closed')
+                source_id = execute(
+                    'INSERT INTO sources (snapshot_id, kind, url, state, closed, status, body) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (snapshot_id, kind, source.get('URL'), source.get('State'),
+                     None if closed is None else int(bool(closed)), _int_or_none(source.get('Status')),
+                     json.dumps(source, separators=(',', ':')))).lastrowid
+                for sharing in source.get('ChatgptSharing', []):
+                    sharing_id = execute(
+                        'INSERT INTO sharings (source_id, number_of_prompts, status) VALUES (?, ?, ?)',
+                        (source_id, _int_or_none(sharing.get('NumberOfPrompts')),
+                         _int_or_none(sharing.get('Status')))).lastrowid
+                    for conversation in sharing.get('Conversations', []):
+                        prompt, answer = conversation.get('Prompt'), conversation.get('Answer')
+                        conversation_id = execute(
+                            'INSERT INTO conversations (source_id, sharing_id, prompt, answer) VALUES (?, ?, ?, ?)',
+                            (source_id, sharing_id, prompt, answer)).lastrowid
+                        execute('INSERT INTO conversation_text (rowid, prompt, answer) VALUES (?, ?, ?)',
+                                (conversation_id, prompt, answer))
+                        self.connection.executemany(
+                            'INSERT INTO snippets (source_id, conversation_id, type, content) VALUES (?, ?, ?, ?)',
+                            [(source_id, conversation_id, code_snippet.get('Type'), code_snippet.get('Content'))
+                             for code_snippet in conversation.get('ListOfCode', [])])
+        return snapshot_id
+
+    def open_snapshot(self, file_path):
+        """Sources of one snapshot file, ingesting it first when new or changed."""
+        if not self.is_ingested(file_path):
+            self.ingest(file_path)
+        return self.sources(snapshot=os.path.basename(file_path))
+
+    def _conditions(self, kind=None, snapshot='latest', state=None, not_state=None, closed=None, status=None,
+               min_prompts=None, max_prompts=None, text=None, snippet_type=None):
+        clauses, params = [], []
+        if snapshot == 'latest':
+            # Dated names sort chronologically, so the greatest name is the newest snapshot of its kind
+            clauses.append('sources.snapshot_id IN (SELECT id FROM snapshots AS latest WHERE name = '
+                           '(SELECT max(name) FROM snapshots WHERE kind IS latest.kind))')
+        elif snapshot is not None:
+            clauses.append('sources.snapshot_id = (SELECT id FROM snapshots WHERE name = ?)')
+            params.append(snapshot)
+        for column, value in (('kind', kind), ('state', state), ('status', status)):
+            if value is not None:
+                clauses.append(f'sources.{column} = ?')
+                params.append(value)
+        if not_state is not None:
+            # IS NOT also keeps sources without a State
+            clauses.append('sources.state IS NOT ?')
+            params.append(not_state)
+        if closed is not None:
+            clauses.append('sources.closed = ?')
+            params.append(int(bool(closed)))
+        if min_prompts is not None or max_prompts is not None:
+            clauses.append('sources.id IN (SELECT source_id FROM sharings WHERE number_of_prompts BETWEEN ? AND ?)')
+            params.extend([-1 << 62 if min_prompts is None else min_prompts,
+                           1 << 62 if max_prompts is None else max_prompts])
+        if text is not None:
+            clauses.append('sources.id IN (SELECT conversations.source_id FROM conversation_text '
+                           'JOIN conversations ON conversations.id = conversation_text.rowid '
+                           'WHERE conversation_text MATCH ?)')
+            params.append(text)
+        if snippet_type is not None:
+            clauses.append('sources.id IN (SELECT source_id FROM snippets WHERE type = ?)')
+            params.append(snippet_type)
+        return clauses, params
+
+    def _where(self, extra_clauses=(), **filters):
+        clauses, params = self._conditions(**filters)
+        clauses.extend(extra_clauses)
+        return ' WHERE ' + ' AND '.join(clauses) if clauses else '', params
+
+    def sources(self, **filters):
+        """Sources matching every given filter, in snapshot order.
+
+        Filters: kind, snapshot (a file name, 'latest' per kind by default, or None
+        for all), state, closed, status, min_prompts/max_prompts (any sharing in
+        range), text (an FTS5 query over Prompt and Answer) and snippet_type.
+        """
+        where, params = self._where(**filters)
+        return StoredSources(self, f'SELECT body FROM sources{where} ORDER BY sources.id', params)
+
+    def snippets(self, languages=None, **filters):
+        """(Type, Content) of every ListOfCode snippet in the matching sources, optionally of some Types only."""
+        extra = []
+        if languages is not None:
+            languages = list(languages)
+            extra.append(f"snippets.type IN ({', '.join('?' * len(languages))})")
+        where, params = self._where(extra, **filters)
+        return self.connection.execute(
+            f'SELECT snippets.type, snippets.content FROM snippets JOIN sources ON sources.id = snippets.source_id'
+            f'{where} ORDER BY snippets.id', params + (languages or []))
+
+    def prompt_counts(self, **filters):
+        """NumberOfPrompts of every sharing in the matching sources."""
+        where, params = self._where(['sharings.number_of_prompts IS NOT NULL'], **filters)
+        return [prompts for prompts, in self.connection.execute(
+            f'SELECT sharings.number_of_prompts FROM sharings JOIN sources ON sources.id = sharings.source_id'
+            f'{where} ORDER BY sharings.id', params)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Ingest snapshots into an indexed SQLite store and query it')
+    parser.add_argument('db_path', help='SQLite database file')
+    parser.add_argument('--ingest', action='append', default=[], help='snapshot file to (re)load (repeatable)')
+    parser.add_argument('--kind', default=None, help='only sources of this kind (pr, issue, discussion, ...)')
+    parser.add_argument('--state', default=None, help='only sources with this State, e.g. CLOSED')
+    parser.add_argument('--closed', choices=['yes', 'no'], default=None, help='only closed or open discussions')
+    parser.add_argument('--text', default=None, help='FTS5 query over conversation prompts and answers')
+    parser.add_argument('--snippet-type', default=None, help='only sources sharing code of this Type')
+    args = parser.parse_args(argv)
+
+    with QueryStore(args.db_path) as store:
+        for file_path in args.ingest:
+            store.ingest(file_path)
+        sources = store.sources(kind=args.kind, state=args.state, text=args.text, snippet_type=args.snippet_type,
+                                closed=None if args.closed is None else args.closed == 'yes')
+        for source in sources:
+            print(source.get('URL'))
+
+
+if __name__ == "__main__":
+    main()
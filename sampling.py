@@ -0,0 +1,160 @@
+import random
+from collections import Counter, namedtuple
+
+from keyword_classifier import classified_conversations
+
+Estimate = namedtuple('Estimate', 'value low high')
+
+
+class StratifiedReservoir:
+    """Uniform sample of up to size items per stratum, drawn in one streaming pass.
+
+    The number of items seen in each stratum is kept, so estimates can weight
+    each sampled item by its stratum's population.
+    """
+
+    def __init__(self, size, seed=None):
+        self.size = size
+        self.random = random.Random(seed)
+        self.seen = Counter()
+        self.samples = {}
+
+    def add(self, stratum, item):
+        self.seen[stratum] += 1
+        sample = self.samples.setdefault(stratum, [])
+        if len(sample) < self.size:
+            sample.append(item)
+        else:
+            # Algorithm R: the n-th item replaces a random slot with probability size / n
+            slot = self.random.randrange(self.seen[stratum])
+            if slot < self.size:
+                sample[slot] = item
+
+    def extend(self, items, stratum):
+        for item in items:
+            self.add(stratum(item), item)
+        return self
+
+    def strata(self, unit=lambda item: item):
+        """{stratum: (population, [unit(item), ...])} for the estimators."""
+        return {key: (self.seen[key], [unit(item) for item in sample]) for key, sample in self.samples.items()}
+
+
+def _percentile(sorted_values, fraction):
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def bootstrap(strata, estimate, replicates=200, confidence=0.95, seed=None):
+    """Point estimates with percentile bootstrap intervals.
+
+    estimate(strata) returns {name: value}; each replicate resamples every
+    stratum's units with replacement, keeping its population.
+    """
+    rng = random.Random(seed)
+    point = estimate(strata)
+    draws = {name: [] for name in point}
+    for _ in range(replicates):
+        # A stratum sampled in full has no sampling error and is kept as is
+        resampled = {key: (population, rng.choices(units, k=len(units)) if 0 < len(units) < population else units)
+                     for key, (population, units) in strata.items()}
+        for name, value in estimate(resampled).items():
+            if name in draws and value is not None:
+                draws[name].append(value)
+    tail = (1 - confidence) / 2
+    estimates = {}
+    for name, value in point.items():
+        values = sorted(draws[name])
+        estimates[name] = Estimate(value, _percentile(values, tail), _percentile(values, 1 - tail)) \
+            if values else Estimate(value, value, value)
+    return estimates
+
+
+def type_estimator(keywords):
+    """Estimator of success percentage and per-keyword counts and accuracy for one kind.
+
+    It takes strata mapping resolved (bool) to (population, [(keyword counts,
+    State is CLOSED), ...]) and returns ('success_percentage',) and
+    (field, keyword) values for the fields DataProcessor.aggregate reports.
+    """
+    def estimate(strata):
+        population = sum(count for count, _ in strata.values())
+        resolved_population = sum(count for resolved, (count, _) in strata.items() if resolved)
+        values = {('success_percentage',): resolved_population / population * 100 if population else 0}
+        totals, state_closed, resolved_counts = Counter(), Counter(), Counter()
+        for resolved, (count, units) in strata.items():
+            if not units:
+                continue
+            # Each sampled source stands for count / len(units) sources of its stratum
+            weight = count / len(units)
+            for keyword_counts, closed in units:
+                for keyword, keyword_count in keyword_counts.items():
+                    totals[keyword] += weight * keyword_count
+                    if closed:
+                        state_closed[keyword] += weight * keyword_count
+                    if resolved:
+                        resolved_counts[keyword] += weight * keyword_count
+        for keyword in keywords:
+            values[('types', keyword)] = totals[keyword]
+            values[('accuracy', keyword)] = state_closed[keyword] / totals[keyword] * 100 if totals[keyword] else None
+            values[('resolved_counts', keyword)] = resolved_counts[keyword]
+            values[('unresolved_counts', keyword)] = totals[keyword] - resolved_counts[keyword]
+        return values
+
+    return estimate
+
+
+def approximate_type_summary(sources, is_resolved, classify, size=1000, replicates=200, seed=None):
+    """Estimate DataProcessor.aggregate's figures from a sample stratified by is_resolved.
+
+    classify(prompt, answer) is only run on the sampled sources. Returns a dict
+    with the aggregate keys holding Estimates, plus the sample and population sizes.
+    """
+    reservoir = StratifiedReservoir(size, seed).extend(sources, lambda source: bool(is_resolved(source)))
+
+    def unit(source):
+        keyword_counts = Counter()
+        state_closed = False
+        for keyword, state_closed in classified_conversations(source, classify):
+            keyword_counts[keyword] += 1
+        # state_closed only weighs keyword counts, so its value without any is moot
+        return keyword_counts, state_closed
+
+    strata = reservoir.strata(unit)
+    keywords = list(dict.fromkeys(keyword for _, units in strata.values()
+                                  for keyword_counts, _ in units for keyword in keyword_counts))
+    estimates = bootstrap(strata, type_estimator(keywords), replicates, seed=seed)
+    summary = {'success_percentage': estimates[('success_percentage',)],
+               'sampled': sum(len(units) for _, units in strata.values()),
+               'population': sum(reservoir.seen.values())}
+    for field in ('types', 'accuracy', 'resolved_counts', 'unresolved_counts'):
+        summary[field] = {keyword: estimates[(field, keyword)] for keyword in keywords}
+    return summary
+
+
+def approximate_prompt_averages(groups, size=1000, replicates=200, seed=None):
+    """Estimate mean NumberOfPrompts per (series name, 'OPEN'|'CLOSED').
+
+    groups holds (sources, is_closed, series name) triples; every group is
+    sampled separately, stratified by state.
+    """
+    strata = {}
+    for sources, is_closed, series_name in groups:
+        reservoir = StratifiedReservoir(size, seed).extend(
+            sources, lambda source: (series_name, 'CLOSED' if is_closed(source) else 'OPEN'))
+        strata.update(reservoir.strata(lambda source: [sharing['NumberOfPrompts']
+                                                        for sharing in source.get('ChatgptSharing', [])
+                                                        if sharing.get('NumberOfPrompts') is not None]))
+        for state in ('OPEN', 'CLOSED'):
+            strata.setdefault((series_name, state), (0, []))
+
+    def estimate(strata):
+        means = {}
+        for key, (_, units) in strata.items():
+            count = sum(len(prompts) for prompts in units)
+            means[key] = sum(map(sum, units)) / count if count else None
+        return means
+
+    return bootstrap(strata, estimate, replicates, seed=seed)
@@ -0,0 +1,288 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+
+from snapshot_stream import FilteredSources, iter_sources
+
+CACHE_VERSION = 1
+MISSING = -1
+
+# Column name -> array typecode. Text columns index into text_offsets, where
+# text i is text.bin[text_offsets[i]:text_offsets[i + 1]].
+COLUMNS = {
+    'source_url': 'q',
+    'source_state': 'b',
+    'source_closed': 'b',
+    'source_status': 'i',
+    'source_sharing_end': 'q',
+    'sharing_prompts': 'i',
+    'sharing_status': 'i',
+    'sharing_conversation_end': 'q',
+    'conversation_text': 'q',
+    'conversation_code_end': 'q',
+    'code_type': 'h',
+    'code_text': 'q',
+    'text_offsets': 'q',
+}
+
+
+def file_sha256(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def default_cache_dir(file_path):
+    return os.path.join(os.path.dirname(os.path.abspath(file_path)), '.snapshot_cache')
+
+
+def _cache_path(file_path, cache_dir):
+    return os.path.join(cache_dir or default_cache_dir(file_path), os.path.basename(file_path) + '.columns')
+
+
+def _int_or_missing(value):
+    return value if isinstance(value, int) and not isinstance(value, bool) else MISSING
+
+
+def build_cache(file_path, cache_path):
+    """Convert a snapshot into columnar cache files under cache_path."""
+    columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+    states, types = [], []
+    state_codes, type_codes = {}, {}
+    offsets = columns['text_offsets']
+    offsets.append(0)
+
+    temp_path = cache_path + '.tmp'
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    with open(os.path.join(temp_path, 'text.bin'), 'wb') as text_file:
+        def add_text(value):
+            data = (value or '').encode('utf-8')
+            text_file.write(data)
+            offsets.append(offsets[-1] + len(data))
+            return len(offsets) - 2
+
+        for source in iter_sources(file_path):
+            columns['source_url'].append(add_text(source.get('URL')))
+            state = source.get('State')
+            if state is None:
+                columns['source_state'].append(MISSING)
+            else:
+                if state not in state_codes:
+                    state_codes[state] = len(states)
+                    states.append(state)
+                columns['source_state'].append(state_codes[state])
+            closed = source.get('Closed')
+            columns['source_closed'].append(MISSING if closed is None else int(bool(closed)))
+            columns['source_status'].append(_int_or_missing(source.get('Status')))
+
+            for sharing in source.get('ChatgptSharing', []):
+                columns['sharing_prompts'].append(_int_or_missing(sharing.get('NumberOfPrompts')))
+                columns['sharing_status'].append(_int_or_missing(sharing.get('Status')))
+                for conversation in sharing.get('Conversations', []):
+                    # Prompt and answer are stored as consecutive texts
+                    columns['conversation_text'].append(add_text(conversation.get('Prompt')))
+                    add_text(conversation.get('Answer'))
+                    for code_snippet in conversation.get('ListOfCode', []):
+                        code_type = code_snippet.get('Type')
+                        if code_type not in type_codes:
+                            type_codes[code_type] = len(types)
+                            types.append(code_type)
+                        columns['code_type'].append(type_codes[code_type])
+                        columns['code_text'].append(add_text(code_snippet.get('Content')))
+                    columns['conversation_code_end'].append(len(columns['code_type']))
+                columns['sharing_conversation_end'].append(len(columns['conversation_text']))
+            columns['source_sharing_end'].append(len(columns['sharing_prompts']))
+
+    for name, values in columns.items():
+        with open(os.path.join(temp_path, name + '.bin'), 'wb') as column_file:
+            values.tofile(column_file)
+
+    stat = os.stat(file_path)
+    meta = {
+        'version': CACHE_VERSION,
+        'byteorder': sys.byteorder,
+        'source': {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': file_sha256(file_path)},
+        'states': states,
+        'types': types,
+    }
+    with open(os.path.join(temp_path, 'meta.json'), 'w', encoding='utf-8') as meta_file:
+        json.dump(meta, meta_file)
+
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(temp_path, cache_path)
+
+
+def _read_meta(cache_path):
+    try:
+        with open(os.path.join(cache_path, 'meta.json'), 'r', encoding='utf-8') as meta_file:
+            return json.load(meta_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def cache_is_fresh(file_path, cache_path, verify=False):
+    """Check a cache against its source's size and mtime, falling back to the content hash."""
+    meta = _read_meta(cache_path)
+    if meta is None or meta.get('version') != CACHE_VERSION or meta.get('byteorder') != sys.byteorder:
+        return False
+    stat = os.stat(file_path)
+    source = meta['source']
+    if stat.st_size != source['size']:
+        return False
+    if stat.st_mtime_ns == source['mtime_ns'] and not verify:
+        return True
+    if file_sha256(file_path) != source['sha256']:
+        return False
+    # Same content with a new mtime (a copy or touch): refresh the stamp instead of rebuilding
+    source['mtime_ns'] = stat.st_mtime_ns
+    with open(os.path.join(cache_path, 'meta.json'), 'w', encoding='utf-8') as meta_file:
+        json.dump(meta, meta_file)
+    return True
+
+
+class CachedConversation(Mapping):
+    """One conversation of a CachedSnapshot; its texts are only decoded when read."""
+
+    __slots__ = ('snapshot', 'index')
+    KEYS = ('Prompt', 'Answer', 'ListOfCode')
+
+    def __init__(self, snapshot, index):
+        self.snapshot = snapshot
+        self.index = index
+
+    def __getitem__(self, key):
+        columns = self.snapshot.columns
+        index = self.index
+        if key == 'Prompt':
+            return self.snapshot.text(columns['conversation_text'][index])
+        if key == 'Answer':
+            return self.snapshot.text(columns['conversation_text'][index] + 1)
+        if key == 'ListOfCode':
+            code_start = columns['conversation_code_end'][index - 1] if index else 0
+            return [{'Type': self.snapshot.types[columns['code_type'][code_index]],
+                     'Content': self.snapshot.text(columns['code_text'][code_index])}
+                    for code_index in range(code_start, columns['conversation_code_end'][index])]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+
+class CachedConversations(Sequence):
+    """The Conversations of one sharing, built on access so tallies never touch them."""
+
+    __slots__ = ('snapshot', 'start', 'stop')
+
+    def __init__(self, snapshot, start, stop):
+        self.snapshot = snapshot
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[index] for index in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError('conversation index out of range')
+        return CachedConversation(self.snapshot, self.start + position)
+
+    def __iter__(self):
+        for index in range(self.start, self.stop):
+            yield CachedConversation(self.snapshot, index)
+
+
+class CachedSnapshot:
+    """Memory-mapped columnar snapshot that iterates like a stream of Sources."""
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        meta = _read_meta(cache_path)
+        self.states = meta['states']
+        self.types = meta['types']
+        self._maps = []
+        self.columns = {name: self._map(name, typecode) for name, typecode in COLUMNS.items()}
+        self.text_bytes = self._map('text', 'B')
+
+    def _map(self, name, typecode):
+        with open(os.path.join(self.cache_path, name + '.bin'), 'rb') as column_file:
+            if os.fstat(column_file.fileno()).st_size == 0:
+                return memoryview(array(typecode))
+            mapped = mmap.mmap(column_file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        self._maps.append((mapped, view))
+        return view.cast(typecode)
+
+    def close(self):
+        for column in self.columns.values():
+            column.release()
+        self.text_bytes.release()
+        for mapped, view in self._maps:
+            view.release()
+            mapped.close()
+        self._maps = []
+
+    def __len__(self):
+        return len(self.columns['source_sharing_end'])
+
+    def text(self, index):
+        offsets = self.columns['text_offsets']
+        return bytes(self.text_bytes[offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+    def source(self, index):
+        """Rebuild the fields the analyses read for one source as a Sources-style dict.
+
+        Conversations are lazy views, so prompt, answer and snippet texts are
+        only decoded for the analyses that read them.
+        """
+        columns = self.columns
+        record = {'URL': self.text(columns['source_url'][index])}
+        if columns['source_state'][index] != MISSING:
+            record['State'] = self.states[columns['source_state'][index]]
+        if columns['source_closed'][index] != MISSING:
+            record['Closed'] = bool(columns['source_closed'][index])
+        if columns['source_status'][index] != MISSING:
+            record['Status'] = columns['source_status'][index]
+
+        sharings = []
+        sharing_start = columns['source_sharing_end'][index - 1] if index else 0
+        for sharing_index in range(sharing_start, columns['source_sharing_end'][index]):
+            prompts = columns['sharing_prompts'][sharing_index]
+            sharing = {'NumberOfPrompts': None if prompts == MISSING else prompts}
+            if columns['sharing_status'][sharing_index] != MISSING:
+                sharing['Status'] = columns['sharing_status'][sharing_index]
+            conversation_start = columns['sharing_conversation_end'][sharing_index - 1] if sharing_index else 0
+            sharing['Conversations'] = CachedConversations(self, conversation_start,
+                                                           columns['sharing_conversation_end'][sharing_index])
+            sharings.append(sharing)
+        record['ChatgptSharing'] = sharings
+        return record
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.source(index)
+
+    def filter(self, predicate):
+        return FilteredSources(self, predicate)
+
+
+def open_cached_snapshot(file_path, cache_dir=None, verify=False):
+    """Open the columnar cache for a snapshot, (re)building it when stale."""
+    cache_path = _cache_path(file_path, cache_dir)
+    if not cache_is_fresh(file_path, cache_path, verify):
+        build_cache(file_path, cache_path)
+    return CachedSnapshot(cache_path)
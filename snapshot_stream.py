@@ -0,0 +1,152 @@
+import gzip
+import io
+import json
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 1 << 16
+_WHITESPACE = ' \t\n\r'
+
+
+def open_snapshot_file(file_path):
+    """Open a snapshot as UTF-8 text, decompressing .gz and .zst files as they are read."""
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rt', encoding='utf-8')
+    if file_path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError as error:
+            raise ImportError(f"Reading {file_path} requires the zstandard package") from error
+        reader = zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), read_across_frames=True,
+                                                             closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8')
+    return open(file_path, 'r', encoding='utf-8')
+
+
+def load_snapshot_file(file_path):
+    with open_snapshot_file(file_path) as file:
+        return json.load(file)
+
+
+def load_snapshots(file_paths, load=load_snapshot_file, max_workers=None):
+    """Run load(file_path) for several snapshots on a thread pool, returning results in order.
+
+    Reads and gzip/zstd decompression release the GIL, so the files' I/O overlaps.
+    """
+    file_paths = list(file_paths)
+    with ThreadPoolExecutor(max_workers=max_workers or len(file_paths) or 1) as executor:
+        return list(executor.map(load, file_paths))
+
+
+def iter_sources(file_path, chunk_size=CHUNK_SIZE):
+    """Yield the entries of a snapshot's 'Sources' array one at a time."""
+    decoder = json.JSONDecoder()
+    with open_snapshot_file(file_path) as file:
+        buffer = ''
+        # Skip ahead to the opening bracket of the Sources array.
+        while True:
+            key_index = buffer.find('"Sources"')
+            if key_index != -1:
+                bracket_index = buffer.find('[', key_index)
+                if bracket_index != -1:
+                    buffer = buffer[bracket_index + 1:]
+                    break
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            # Keep a short tail in case the key straddles two chunks.
+            buffer = buffer[-16:] + chunk if key_index == -1 else buffer + chunk
+
+        position = 0
+        eof = False
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE + ',':
+                position += 1
+            if position == len(buffer):
+                if eof:
+                    raise ValueError(f"Unterminated Sources array in {file_path}")
+                buffer = file.read(chunk_size)
+                position = 0
+                eof = not buffer
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                source, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The record is incomplete; read at least as much again so a
+                # large record costs a logarithmic number of retries.
+                chunk = file.read(max(chunk_size, len(buffer) - position))
+                buffer = buffer[position:] + chunk
+                position = 0
+                eof = not chunk
+                continue
+            yield source
+            position = end
+            if position > chunk_size:
+                buffer = buffer[position:]
+                position = 0
+
+
+class SnapshotSources:
+    """Re-iterable view of a snapshot's Sources, streamed from disk on every pass."""
+
+    def __init__(self, file_path, predicate=None):
+        self.file_path = file_path
+        self.predicate = predicate
+
+    def __iter__(self):
+        for source in iter_sources(self.file_path):
+            if self.predicate is None or self.predicate(source):
+                yield source
+
+    def filter(self, predicate):
+        if self.predicate is None:
+            return SnapshotSources(self.file_path, predicate)
+        previous = self.predicate
+        return SnapshotSources(self.file_path, lambda source: previous(source) and predicate(source))
+
+
+class FilteredSources:
+    """Lazily filtered view over any re-iterable collection of Sources."""
+
+    def __init__(self, sources, predicate):
+        self.sources = sources
+        self.predicate = predicate
+
+    def __iter__(self):
+        for source in self.sources:
+            if self.predicate(source):
+                yield source
+
+    def filter(self, predicate):
+        return FilteredSources(self, predicate)
+
+
+def sources_of(data):
+    """Return the Sources of a loaded snapshot dict, or the iterable itself."""
+    if isinstance(data, Mapping):
+        return data['Sources']
+    return data
+
+
+def is_available(source, kind):
+    """False for sources whose page was gone (Status 404) when the snapshot was taken.
+
+    Discussions record the status on their first sharing, other kinds on the source.
+    """
+    if kind == 'discussion':
+        return source['ChatgptSharing'][0].get('Status') != 404
+    return source.get('Status') != 404
+
+
+def filter_sources(data, predicate):
+    """Drop Sources failing predicate, copying dicts and filtering streams lazily."""
+    if isinstance(data, Mapping):
+        data['Sources'] = [source for source in data['Sources'] if predicate(source)]
+        return data
+    if hasattr(data, 'filter'):
+        return data.filter(predicate)
+    return FilteredSources(data, predicate)
@@ -0,0 +1,138 @@
+import argparse
+import hashlib
+from collections import Counter, namedtuple
+
+from query_store import snapshot_kind
+from snapshot_cache import open_cached_snapshot
+from snapshot_stream import SnapshotSources
+
+# Where a snippet occurs: its Type, snapshot kind, source URL and position in the source
+Occurrence = namedtuple('Occurrence', 'digest type kind url sharing conversation position')
+
+
+def normalize_snippet(content):
+    """Snippet text with unified newlines, trailing whitespace and surrounding blank lines removed."""
+    lines = (content or '').replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip('\n')
+
+
+def snippet_digest(normalized):
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def line_count(content):
+    return content.count('\n') + 1 if content else 0
+
+
+class SnippetStore:
+    """Content-addressed ListOfCode corpus: each distinct snippet is stored and analyzed once.
+
+    Snippets from any number of snapshots and kinds can be added; analysis
+    results are joined back to every occurrence.
+    """
+
+    def __init__(self):
+        self.contents = {}
+        self.occurrences = []
+        # (digest, Type) -> number of occurrences, in first-seen order
+        self.counts = Counter()
+        self.results = {}
+
+    def add(self, content, snippet_type, kind=None, url=None, sharing=None, conversation=None, position=None):
+        normalized = normalize_snippet(content)
+        digest = snippet_digest(normalized)
+        self.contents.setdefault(digest, normalized)
+        self.occurrences.append(Occurrence(digest, snippet_type, kind, url, sharing, conversation, position))
+        self.counts[(digest, snippet_type)] += 1
+        return digest
+
+    def add_sources(self, sources, kind=None):
+        """Record every ListOfCode snippet of the Sources; returns how many were added."""
+        added = 0
+        for source in sources:
+            url = source.get('URL')
+            for sharing_index, sharing in enumerate(source.get('ChatgptSharing', [])):
+                for conversation_index, conversation in enumerate(sharing.get('Conversations', [])):
+                    for position, code_snippet in enumerate(conversation.get('ListOfCode', [])):
+                        self.add(code_snippet.get('Content'), code_snippet.get('Type'), kind, url,
+                                 sharing_index, conversation_index, position)
+                        added += 1
+        return added
+
+    def __len__(self):
+        return len(self.contents)
+
+    def unique(self, snippet_type=None):
+        """Yield (digest, Type, content, occurrence count) once per distinct snippet and Type."""
+        for (digest, code_type), count in self.counts.items():
+            if snippet_type is None or code_type == snippet_type:
+                yield digest, code_type, self.contents[digest], count
+
+    def analyze(self, name, function, by_type=False):
+        """Run function(content) (or function(content, Type) when by_type) once per distinct snippet.
+
+        Results are kept under name, so calling again only analyzes snippets added since.
+        """
+        table = self.results.setdefault(name, {})
+        for digest, code_type, content, _ in self.unique():
+            key = (digest, code_type) if by_type else digest
+            if key not in table:
+                table[key] = function(content, code_type) if by_type else function(content)
+        return table
+
+    def join(self, name, by_type=False):
+        """Yield (occurrence, result) for every occurrence, in the order they were added."""
+        table = self.results[name]
+        for occurrence in self.occurrences:
+            yield occurrence, table.get((occurrence.digest, occurrence.type) if by_type else occurrence.digest)
+
+    def measure(self, engine, on_snippet=None):
+        """ComplexityEngine.scan over the corpus, analyzing each distinct snippet once.
+
+        on_snippet(language, code, metric, occurrences) is called once per distinct
+        snippet; the returned {language: [metric, ...]} still has one entry per occurrence.
+        """
+        table = self.results.setdefault('complexity', {})
+        for digest, code_type, content, count in self.unique():
+            if code_type not in engine.analyzers:
+                continue
+            metric = table[(digest, code_type)] = engine.analyze(code_type, content)
+            if on_snippet is not None:
+                on_snippet(code_type, content, metric, count)
+        metrics = {language: [] for language in engine.analyzers}
+        for occurrence, metric in self.join('complexity', by_type=True):
+            if occurrence.type in metrics and metric is not None:
+                metrics[occurrence.type].append(metric)
+        return metrics
+
+    def language_stats(self):
+        """{Type: occurrences, distinct snippets and lines of distinct snippets}."""
+        lines = self.analyze('lines', line_count)
+        stats = {}
+        for digest, code_type, _, count in self.unique():
+            entry = stats.setdefault(code_type, {'occurrences': 0, 'unique': 0, 'lines': 0})
+            entry['occurrences'] += count
+            entry['unique'] += 1
+            entry['lines'] += lines[digest]
+        return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Deduplicate ListOfCode snippets across snapshot files')
+    parser.add_argument('file_paths', nargs='+', help='snapshot *_sharings.json files of any kinds')
+    parser.add_argument('--cache', action='store_true',
+                        help='read snapshots through the memory-mapped columnar cache, building it on first use')
+    args = parser.parse_args(argv)
+
+    store = SnippetStore()
+    for file_path in args.file_paths:
+        sources = open_cached_snapshot(file_path) if args.cache else SnapshotSources(file_path)
+        store.add_sources(sources, snapshot_kind(file_path))
+    total = len(store.occurrences)
+    print(f"{total} snippets, {len(store)} distinct ({total / len(store) if store else 0:.2f}x duplication)")
+    for code_type, stats in sorted(store.language_stats().items(), key=lambda item: -item[1]['occurrences']):
+        print(f"{code_type}: {stats['occurrences']} occurrences, {stats['unique']} distinct, {stats['lines']} lines")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+OPEN = 'Open'
+CLOSED = 'Closed'
+UNCERTAIN = 'Uncertain'
+
+# Phrases in an answer suggesting the sharing is still open
+OPEN_TERMS = ['Concerns', 'Revisit', 'Review', 'Thoroughly', 'Additional information', 'Reconsider', 'Alternative',
+              'Explore', 'Possibilities', 'Not on the same page', 'Not reached a resolution', 'Collaboration', 'Issue',
+              'Investigate', 'Progress', 'Insights', 'Not the same page', 'Alternative solutions', 'Challenge',
+              'Less-than-ideal situation']
+
+# Phrases suggesting it reached a conclusion
+CLOSED_TERMS = ['Closed', 'Result', 'Gratitude', 'Appreciate', 'Information', 'Confirmation', 'Closure', 'Assistance',
+                'Future', 'Reach out', 'Implement', 'Thanks', 'Discussing', 'Collaboration', 'Consider',
+                'Understanding', 'Alternative', 'Approaches', 'Solutions', 'Investigating', 'Progress', 'Insights',
+                'Follow up', 'Circle back', 'Findings']
+
+
+def _alternation(terms):
+    # Longest first so a phrase wins over a word it starts with
+    return '|'.join(re.escape(term) for term in sorted(set(terms), key=len, reverse=True))
+
+
+class StateClassifier:
+    """Label answers Open, Closed or Uncertain with one compiled case-insensitive pattern."""
+
+    def __init__(self, open_terms=OPEN_TERMS, closed_terms=CLOSED_TERMS):
+        # Open is listed first so terms in both lists count as Open, as they always have
+        self.pattern = re.compile(
+            r'\b(?:(?P<open>%s)|(?P<closed>%s))\b' % (_alternation(open_terms), _alternation(closed_terms)),
+            re.IGNORECASE)
+
+    def classify_answer(self, answer):
+        """Open if any open term occurs, else Closed if any closed term occurs, else Uncertain."""
+        label = UNCERTAIN
+        for match in self.pattern.finditer(answer or ''):
+            if match.lastgroup == 'open':
+                return OPEN
+            label = CLOSED
+        return label
+
+    def classify_answers(self, answers):
+        return [self.classify_answer(answer) for answer in answers]
+
+    @staticmethod
+    def concluding_answer(source):
+        """The last answer of a source's first sharing, which decides its label."""
+        sharings = source.get('ChatgptSharing') or [{}]
+        conversations = sharings[0].get('Conversations') or []
+        return conversations[-1].get('Answer', '') if conversations else None
+
+    def classify_sources(self, sources, max_workers=None, chunk_size=2000):
+        """Return one label per source, classifying across a process pool when max_workers is set."""
+        answers = [self.concluding_answer(source) for source in sources]
+        if not max_workers:
+            return [UNCERTAIN if answer is None else self.classify_answer(answer) for answer in answers]
+
+        chunks = [answers[start:start + chunk_size] for start in range(0, len(answers), chunk_size)]
+        labels = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for chunk_labels in executor.map(self.classify_answers, chunks):
+                labels.extend(chunk_labels)
+        return [UNCERTAIN if answer is None else label for answer, label in zip(answers, labels)]
+
+
+def state_agreement(labels, states):
+    """Compare predicted labels with the real State of each source.
+
+    Returns the confusion counts, the share of sources given a definite label
+    (coverage) and how often a definite label matches the State (agreement).
+    """
+    confusion = Counter()
+    decided = matched = 0
+    for label, state in zip(labels, states):
+        confusion[(label, state)] += 1
+        if label != UNCERTAIN:
+            decided += 1
+            matched += (label == OPEN and state == 'OPEN') or (label == CLOSED and state == 'CLOSED')
+    total = sum(confusion.values())
+    return {
+        'confusion': {f'{label}/{state}': count for (label, state), count in sorted(confusion.items(), key=str)},
+        'coverage': decided / total if total else 0,
+        'agreement': matched / decided if decided else 0,
+    }
@@ -0,0 +1,117 @@
+import argparse
+import json
+import random
+
+KINDS = ('issue', 'pr', 'discussion', 'commit')
+
+_WORDS = ('the', 'a', 'to', 'of', 'and', 'is', 'in', 'it', 'this', 'that', 'function', 'value', 'return',
+          'code', 'bug', 'error', 'feature', 'what is', 'please', 'thanks', 'review', 'investigate',
+          'closed', 'implement', 'alternative', 'progress', 'issue', 'solution', 'test', 'update', 'call',
+          'variable', 'class', 'module', 'exception', 'null', 'array', 'loop', 'performance', 'api')
+
+_CODE = {
+    'python': [
+        'def {name}(items):\n    total = 0\n    for item in items:\n        if item and item > 0:\n'
+        '            total += item\n        elif item is None:\n            continue\n    return total\n',
+        'try:\n    {name}()\nexcept ValueError as error:\n    print(error)\n',
+        'result = [x for x in data if x % 2 == 0 or x > 10]\n',
+    ],
+    'java': [
+        'public int {name}(int[] values) {{\n    int total = 0;\n    for (int v : values) {{\n'
+        '        if (v > 0 && v < 100) {{\n            total += v;\n        }}\n    }}\n    return total;\n}}\n',
+        'switch (state) {{\n    case OPEN: return "open";\n    case CLOSED: return "closed";\n    default: return null;\n}}\n',
+    ],
+    'javascript': [
+        'function {name}(list) {{\n  return list.filter(x => x != null || x === 0).map(x => x > 1 ? x : 1);\n}}\n',
+        'async function {name}() {{\n  try {{\n    const res = await fetch(url);\n    while (!res.ok) {{ await retry(); }}\n'
+        '  }} catch (e) {{\n    console.error(e);\n  }}\n}}\n',
+    ],
+    'bash': ['for f in *.json; do\n  echo "$f"\ndone\n'],
+}
+
+
+def _text(rng, low, high):
+    words = rng.choices(_WORDS, k=rng.randint(low, high))
+    if rng.random() < 0.1:
+        # Some answers carry markup and entities, like rendered ChatGPT output
+        words.insert(rng.randint(0, len(words)), '<code>x &amp; y</code>')
+    return ' '.join(words)
+
+
+def _conversation(rng, code_pool):
+    snippets = []
+    for _ in range(rng.choices((0, 1, 2, 3), weights=(5, 3, 1, 1))[0]):
+        language = rng.choice(tuple(_CODE))
+        if code_pool and rng.random() < 0.5:
+            # ChatGPT repeats the same code across conversations
+            language, content = rng.choice(code_pool)
+        else:
+            content = rng.choice(_CODE[language]).format(name=f'fn{rng.randint(0, 99999)}')
+            code_pool.append((language, content))
+            if len(code_pool) > 1000:
+                code_pool.pop(0)
+        snippets.append({'ReplaceString': '[CODE_BLOCK_0]', 'Type': language, 'Content': content})
+    return {'Prompt': _text(rng, 3, 40), 'Answer': _text(rng, 20, 300), 'ListOfCode': snippets}
+
+
+def _source(rng, kind, index, conversations, code_pool):
+    sharings = []
+    remaining = conversations
+    while remaining > 0:
+        turns = min(remaining, rng.randint(1, 8))
+        remaining -= turns
+        sharings.append({
+            'URL': f'https://chat.openai.com/share/{kind}-{index}-{len(sharings)}',
+            'Status': 404 if rng.random() < 0.03 else 200,
+            'DateOfConversation': 'August 30, 2023',
+            'NumberOfPrompts': turns if rng.random() > 0.02 else None,
+            'Conversations': [_conversation(rng, code_pool) for _ in range(turns)],
+        })
+    source = {
+        'Type': kind,
+        'URL': f'https://github.com/example/repo/{kind}/{index}',
+        'Title': _text(rng, 3, 12),
+        'Body': _text(rng, 10, 80),
+        'ChatgptSharing': sharings,
+    }
+    if kind == 'discussion':
+        source['Closed'] = rng.random() < 0.4
+    elif kind in ('issue', 'pr'):
+        source['State'] = 'CLOSED' if rng.random() < 0.6 else 'OPEN'
+        source['Status'] = 404 if rng.random() < 0.02 else 200
+    return source
+
+
+def write_snapshot(file_path, kind='issue', conversations=1000, seed=0):
+    """Write a synthetic *_sharings.json with about the given number of conversations, one source at a time."""
+    if kind not in KINDS:
+        raise ValueError(f"Invalid kind. Use one of {', '.join(KINDS)}.")
+    rng = random.Random(seed)
+    code_pool = []
+    written = 0
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write('{"Sources": [')
+        index = 0
+        while written < conversations:
+            count = min(conversations - written, rng.randint(1, 12))
+            if index:
+                file.write(',\n')
+            json.dump(_source(rng, kind, index, count, code_pool), file)
+            written += count
+            index += 1
+        file.write(']}\n')
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a synthetic DevGPT snapshot')
+    parser.add_argument('file_path')
+    parser.add_argument('--kind', choices=KINDS, default='issue')
+    parser.add_argument('--conversations', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    write_snapshot(args.file_path, args.kind, args.conversations, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import html
+import os
+import re
+from functools import lru_cache
+
+from instrumentation import timed_stage
+
+_NON_ALPHANUMERIC = re.compile(r'[^a-zA-Z0-9\s]')
+_WHITESPACE = re.compile(r'\s+')
+
+# NLTK corpora are looked up locally; downloading is opt-in for air-gapped workers
+NLTK_DATA_ENV = 'SEPROJECT_NLTK_DATA'
+NLTK_DOWNLOAD_ENV = 'SEPROJECT_NLTK_DOWNLOAD'
+NLTK_RESOURCES = {'stopwords': 'corpora/stopwords', 'punkt': 'tokenizers/punkt',
+                  'punkt_tab': 'tokenizers/punkt_tab/english/', 'wordnet': 'corpora/wordnet'}
+
+_nltk_settings = {
+    'data_path': os.environ.get(NLTK_DATA_ENV),
+    'allow_download': os.environ.get(NLTK_DOWNLOAD_ENV, '') not in ('', '0'),
+}
+
+
+def configure_nltk(data_path=None, allow_download=None):
+    """Set where NLTK corpora are found and whether missing ones may be downloaded."""
+    if data_path is not None:
+        _nltk_settings['data_path'] = data_path
+    if allow_download is not None:
+        _nltk_settings['allow_download'] = allow_download
+
+
+def ensure_nltk_resources(packages):
+    """Check NLTK packages are installed locally, downloading them only when allowed."""
+    import nltk
+
+    data_path = _nltk_settings['data_path']
+    if data_path and data_path not in nltk.data.path:
+        nltk.data.path.insert(0, data_path)
+
+    def missing_packages():
+        missing = []
+        for package in packages:
+            try:
+                nltk.data.find(NLTK_RESOURCES[package])
+            except LookupError:
+                missing.append(package)
+        return missing
+
+    missing = missing_packages()
+    if missing and _nltk_settings['allow_download']:
+        for package in missing:
+            nltk.download(package, download_dir=data_path, quiet=True)
+        missing = missing_packages()
+    if missing:
+        raise LookupError(f"NLTK data not found: {', '.join(missing)}. Install it under "
+                          f"{data_path or 'an NLTK_DATA directory'} or set {NLTK_DOWNLOAD_ENV}=1 to download it.")
+
+
+def punkt_package():
+    """The sentence tokenizer data word_tokenize loads: punkt_tab from NLTK 3.8.2 on, punkt before."""
+    from nltk.tokenize import punkt
+
+    return 'punkt_tab' if hasattr(punkt, 'PunktTokenizer') else 'punkt'
+
+
+class TextCleaner:
+    """Reusable text cleaning pipeline with NLTK resources loaded once."""
+
+    def __init__(self, remove_stopwords=False, lemma_cache_size=100000):
+        ensure_nltk_resources([punkt_package(), 'wordnet'] + (['stopwords'] if remove_stopwords else []))
+        from nltk.stem import WordNetLemmatizer
+        from nltk.tokenize import word_tokenize
+
+        # clean_text computed a stopword-filtered string and then lemmatized the
+        # unfiltered tokens, so stopwords stay in unless asked for explicitly.
+        self.remove_stopwords = remove_stopwords
+        if remove_stopwords:
+            from nltk.corpus import stopwords
+            self.stop_words = frozenset(stopwords.words('english'))
+        else:
+            self.stop_words = frozenset()
+        self.tokenize = word_tokenize
+        self.lemmatize = lru_cache(maxsize=lemma_cache_size)(WordNetLemmatizer().lemmatize)
+        self._soup = None
+
+    def strip_markup(self, text):
+        """Remove HTML tags and decode entities, skipping the parser for plain text."""
+        if '<' not in text and '&' not in text:
+            return text
+        if self._soup is None:
+            from bs4 import BeautifulSoup
+            self._soup = BeautifulSoup
+        return html.unescape(self._soup(text, 'html.parser').get_text())
+
+    def clean(self, text):
+        """Clean a single text, returning None for missing values."""
+        if text is None:
+            return None
+        cleaned_text = self.strip_markup(text).lower()
+        cleaned_text = _NON_ALPHANUMERIC.sub('', cleaned_text)
+        word_tokens = self.tokenize(cleaned_text)
+        if self.remove_stopwords:
+            word_tokens = [word for word in word_tokens if word not in self.stop_words]
+        cleaned_text = ' '.join([self.lemmatize(word) for word in word_tokens])
+        return _WHITESPACE.sub(' ', cleaned_text).strip()
+
+    @timed_stage('TextCleaner.clean_many', records=len)
+    def clean_many(self, texts):
+        """Clean a batch of texts, cleaning each distinct text only once."""
+        cleaned = {}
+        results = []
+        for text in texts:
+            if text not in cleaned:
+                cleaned[text] = self.clean(text)
+            results.append(cleaned[text])
+        return results